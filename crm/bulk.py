@@ -0,0 +1,89 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counts, response_cache, search
+from .models import Customer
+from .phones import normalize_phone, valid_phone
+
+
+def bulk_chunk_size():
+    return getattr(settings, 'CRM_BULK_CHUNK_SIZE', 1000)
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` items from ``iterable``.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _field(row, name):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+
+
+def import_customers(rows, chunk_size=None, progress=None, collect=True):
+    """
+    Create customers from ``rows`` (CustomerInput objects or dicts) chunk by
+    chunk: one query finds the emails that already exist and one
+    ``bulk_create`` inserts the rest.
+
+    Returns (created, errors): the created customers (or just how many were
+    created when ``collect`` is false) and one message per rejected row, in
+    row order. ``progress(processed, created, errors)`` is called after each
+    chunk. Each chunk commits on its own unless the caller wraps the import
+    in a transaction.
+    """
+    chunk_size = chunk_size or bulk_chunk_size()
+    created = [] if collect else 0
+    errors = []
+    seen = set()
+    processed = 0
+
+    for chunk in chunked(rows, chunk_size):
+        emails = {_field(row, 'email') for row in chunk}
+        existing = set(
+            Customer.objects.filter(email__in=emails).values_list('email', flat=True)
+        )
+        new = []
+        for idx, row in enumerate(chunk, start=processed + 1):
+            email, phone = _field(row, 'email'), _field(row, 'phone')
+            if email in existing:
+                errors.append(f"Row {idx}: Email already exists.")
+                continue
+            if email in seen:
+                errors.append(f"Row {idx}: Duplicate email in batch.")
+                continue
+            if not valid_phone(phone):
+                errors.append(f"Row {idx}: Invalid phone format.")
+                continue
+            seen.add(email)
+            # bulk_create skips the pre_save signal that normalizes phones
+            new.append(Customer(
+                name=_field(row, 'name'), email=email, phone=phone, phone_normalized=normalize_phone(phone)
+            ))
+
+        if new:
+            with transaction.atomic():
+                Customer.objects.bulk_create(new, batch_size=chunk_size)
+                # bulk_create sends no post_save, so keep the counter and
+                # the search index in step here
+                counts.adjust(Customer, len(new))
+                search.index(Customer, new)
+            response_cache.invalidate_models(Customer)
+
+        if collect:
+            created.extend(new)
+        else:
+            created += len(new)
+        processed += len(chunk)
+        if progress is not None:
+            progress(processed, len(created) if collect else created, errors)
+
+    return created, errors
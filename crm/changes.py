@@ -0,0 +1,108 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Customer, Order, Product, Tombstone
+from .pagination import seek
+
+CHANGES_PREFIX = 'changes'
+MAX_PAGE_SIZE = 1000
+
+# Feed sources in tie-break order: (model, timestamp column)
+SOURCES = (
+    (Customer, 'updated_at'),
+    (Product, 'updated_at'),
+    (Order, 'updated_at'),
+    (Tombstone, 'deleted_at'),
+)
+
+
+def change_feed_lag():
+    return timedelta(seconds=getattr(settings, 'CRM_CHANGE_FEED_LAG', 5))
+
+
+def encode_position(timestamp, rank, pk):
+    payload = json.dumps([CHANGES_PREFIX, timestamp.isoformat(), rank, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_position(cursor):
+    """
+    (timestamp, source rank, pk) stored in a change feed cursor, or None if
+    ``cursor`` is not one.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        prefix, timestamp, rank, pk = payload
+        timestamp = parse_datetime(timestamp)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if prefix != CHANGES_PREFIX or timestamp is None:
+        return None
+    return timestamp, int(rank), int(pk)
+
+
+class Change:
+    def __init__(self, timestamp, rank, obj):
+        self.timestamp = timestamp
+        self.rank = rank
+        self.obj = obj
+
+    @property
+    def deleted(self):
+        return isinstance(self.obj, Tombstone)
+
+    @property
+    def cursor(self):
+        return encode_position(self.timestamp, self.rank, self.obj.pk)
+
+    def sort_key(self):
+        return (self.timestamp, self.rank, self.obj.pk)
+
+
+def _after(rank, column, position):
+    """
+    Rows of source ``rank`` that come after ``position`` in feed order
+    (timestamp, source rank, pk).
+    """
+    timestamp, position_rank, pk = position
+    if rank < position_rank:
+        return Q(**{f'{column}__gt': timestamp})
+    if rank > position_rank:
+        return Q(**{f'{column}__gte': timestamp})
+    return seek((column, 'id'), (timestamp, pk))
+
+
+def changes(since=None, first=100):
+    """
+    Customers, products and orders changed (and tombstones of those deleted)
+    after cursor ``since``, oldest first.
+
+    Each source is read with a range scan on its (timestamp, id) index and
+    the sources are merged, so a page costs O(first) whatever the table
+    sizes. Changes younger than ``CRM_CHANGE_FEED_LAG`` are held back so the
+    transactions around them can commit first. Timestamps are taken when a
+    row is saved, not when its transaction commits, so resuming from a
+    cursor skips no change only if every transaction commits within
+    ``CRM_CHANGE_FEED_LAG``. A longer one can commit a row behind a cursor
+    that was already handed out.
+
+    Returns (changes, has_more).
+    """
+    first = max(1, min(first, MAX_PAGE_SIZE))
+    position = decode_position(since) if since else None
+    settled = timezone.now() - change_feed_lag()
+    merged = []
+    for rank, (model, column) in enumerate(SOURCES):
+        rows = model.objects.filter(**{f'{column}__lt': settled})
+        if position is not None:
+            rows = rows.filter(_after(rank, column, position))
+        for obj in rows.order_by(column, 'id')[:first + 1]:
+            merged.append(Change(getattr(obj, column), rank, obj))
+    merged.sort(key=Change.sort_key)
+    return merged[:first], len(merged) > first
@@ -0,0 +1,178 @@
+from django.conf import settings
+from graphql import (
+    ExecutionContext,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+)
+from graphql.execution.values import get_argument_values
+from graphene_django.settings import graphene_settings
+
+from . import changes
+
+# Extra cost of individual fields on top of the default (1 for object
+# fields, 0 for scalars), keyed by field name
+FIELD_COSTS = {
+    'totalCount': 1,
+    'updateLowStockProducts': 10,
+    'bulkCreateCustomers': 10,
+    'startCustomerImport': 10,
+    'batchCreateOrders': 10,
+}
+
+
+# Largest page the resolvers of page objects return, keyed by field name;
+# a larger ``first`` is clamped to it
+PAGE_SIZE_LIMITS = {
+    'changes': changes.MAX_PAGE_SIZE,
+}
+
+
+def max_cost():
+    return getattr(settings, 'CRM_QUERY_MAX_COST', 5000)
+
+
+def max_depth():
+    return getattr(settings, 'CRM_QUERY_MAX_DEPTH', 12)
+
+
+def default_list_size():
+    return getattr(settings, 'CRM_QUERY_LIST_SIZE', 10)
+
+
+def default_page_size():
+    return graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+
+
+def _is_connection(graphql_type):
+    return graphql_type.name.endswith('Connection') and 'edges' in getattr(graphql_type, 'fields', {})
+
+
+class CostAnalyzer:
+    """
+    Static cost of an operation, computed from the validated document and
+    the coerced variables before anything is resolved.
+
+    Object fields cost 1 and scalars 0 (plus ``FIELD_COSTS``). The cost of a
+    connection's ``edges`` is multiplied by its ``first``/``last`` argument
+    (or the relay page size), and so are the lists of page objects such as
+    ``changes(first:) { changes }``. Plain lists taking ``first`` are
+    multiplied by that, and other plain lists by ``CRM_QUERY_LIST_SIZE``.
+    """
+
+    def __init__(self, schema, fragments, variable_values):
+        self.schema = schema
+        self.fragments = fragments
+        self.variable_values = variable_values
+
+    def analyze(self, operation):
+        """
+        Return (cost, depth) of ``operation``.
+        """
+        root_type = self.schema.get_root_type(operation.operation)
+        return self._selection_set(root_type, operation.selection_set, 0)
+
+    def _selection_set(self, parent_type, selection_set, depth, page_size=None):
+        cost, deepest = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self._field(parent_type, selection, depth + 1, page_size)
+            elif isinstance(selection, (FragmentSpreadNode, InlineFragmentNode)):
+                if isinstance(selection, FragmentSpreadNode):
+                    fragment = self.fragments.get(selection.name.value)
+                    if fragment is None:
+                        continue
+                else:
+                    fragment = selection
+                fragment_type = parent_type
+                if fragment.type_condition is not None:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value) or parent_type
+                field_cost, field_depth = self._selection_set(
+                    fragment_type, fragment.selection_set, depth, page_size
+                )
+            else:
+                continue
+            cost += field_cost
+            deepest = max(deepest, field_depth)
+        return cost, deepest
+
+    def _field(self, parent_type, node, depth, page_size=None):
+        name = node.name.value
+        fields = getattr(parent_type, 'fields', {})
+        if name.startswith('__') or name not in fields:
+            return 0, depth
+
+        field_def = fields[name]
+        named_type = get_named_type(field_def.type)
+        base = FIELD_COSTS.get(name, 1 if node.selection_set else 0)
+        if node.selection_set is None:
+            return base, depth
+
+        child_page_size = None
+        if _is_connection(named_type):
+            args = get_argument_values(field_def, node, self.variable_values)
+            child_page_size = args.get('first') or args.get('last') or default_page_size()
+        elif 'first' in field_def.args and not is_list_type(get_nullable_type(field_def.type)):
+            # A page object: its lists hold the ``first`` requested rows
+            first = get_argument_values(field_def, node, self.variable_values).get('first')
+            if first is not None:
+                child_page_size = max(min(first, PAGE_SIZE_LIMITS.get(name, first)), 0)
+        child_cost, child_depth = self._selection_set(
+            named_type, node.selection_set, depth, child_page_size
+        )
+
+        multiplier = 1
+        if is_list_type(get_nullable_type(field_def.type)):
+            if page_size is not None:
+                # edges of a connection (or a page object's rows) repeat
+                # once per requested row
+                multiplier = page_size
+            elif 'first' in field_def.args:
+                # plain lists with their own page size, e.g. search(first:)
+                first = get_argument_values(field_def, node, self.variable_values).get('first')
+                multiplier = max(first, 0) if first is not None else default_list_size()
+            else:
+                multiplier = default_list_size()
+        return base + multiplier * child_cost, child_depth
+
+
+class CostExecutionContext(ExecutionContext):
+    """
+    Execution context that rejects operations over ``CRM_QUERY_MAX_COST`` or
+    ``CRM_QUERY_MAX_DEPTH`` before any resolver runs, and reports the
+    computed cost in the response ``extensions``.
+    """
+
+    cost = None
+    depth = None
+
+    def execute_operation(self, operation, root_value):
+        analyzer = CostAnalyzer(self.schema, self.fragments, self.variable_values)
+        self.cost, self.depth = analyzer.analyze(operation)
+        limit, depth_limit = max_cost(), max_depth()
+        if (limit and self.cost > limit) or (depth_limit and self.depth > depth_limit):
+            raise GraphQLError(
+                f"Query cost {self.cost} (depth {self.depth}) exceeds the limit "
+                f"of {limit} (depth {depth_limit}).",
+                operation,
+                extensions={
+                    'code': 'QUERY_TOO_COMPLEX',
+                    'cost': self.cost,
+                    'maxCost': limit,
+                    'depth': self.depth,
+                    'maxDepth': depth_limit,
+                },
+            )
+        return super().execute_operation(operation, root_value)
+
+    def build_response(self, data, errors):
+        result = super().build_response(data, errors)
+        if self.cost is not None:
+            result.extensions = {
+                'cost': {'requested': self.cost, 'maximum': max_cost(), 'depth': self.depth},
+            }
+        return result
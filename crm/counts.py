@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import ModelCounter
+
+logger = logging.getLogger(__name__)
+
+# Connection arguments that page through a result but don't change its size
+PAGINATION_ARGS = {'first', 'last', 'before', 'after', 'offset'}
+
+
+def count_cache_ttl():
+    return getattr(settings, 'CRM_COUNT_CACHE_TTL', 30)
+
+
+def count_cap():
+    return getattr(settings, 'CRM_COUNT_CAP', 10000)
+
+
+def model_label(model):
+    return model._meta.label
+
+
+def adjust(model, delta):
+    """
+    Add ``delta`` to the stored row count of ``model`` once the current
+    transaction commits.
+
+    The UPDATE runs on its own after the commit, so concurrent writers only
+    queue on the counter row for that one statement rather than for their
+    whole transaction, and a rolled back write changes nothing. A missing
+    counter row is left alone: it is initialised from an exact count the
+    first time it is read. Deltas lost to a failure or to a race with that
+    first count are corrected by the periodic ``rebuild_counts`` task.
+    """
+    label = model_label(model)
+    transaction.on_commit(lambda: _apply(label, delta), robust=True)
+
+
+def _apply(label, delta):
+    ModelCounter.objects.filter(label=label).update(count=F('count') + delta)
+
+
+def rebuild(model):
+    """
+    Reset the stored row count of ``model`` from an exact COUNT(*).
+    """
+    count = model._default_manager.count()
+    ModelCounter.objects.update_or_create(label=model_label(model), defaults={'count': count})
+    return count
+
+
+def stored_count(model):
+    counter = ModelCounter.objects.filter(label=model_label(model)).values_list('count', flat=True).first()
+    if counter is None:
+        return rebuild(model)
+    return max(counter, 0)
+
+
+def cache_key(model, args):
+    """
+    Cache key for the count of ``model`` rows matching the filter ``args``.
+    """
+    filters = {k: v for k, v in args.items() if k not in PAGINATION_ARGS and not k.startswith('_')}
+    payload = json.dumps(filters, sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    return f'crm:count:{model_label(model)}:{digest}'
+
+
+def capped_count(queryset, cap=None):
+    """
+    COUNT(*) that stops scanning after ``cap`` rows.
+    """
+    cap = count_cap() if cap is None else cap
+    if not cap:
+        return queryset.count()
+    return queryset.order_by()[:cap].count()
+
+
+def estimate_count(queryset):
+    """
+    The planner's row estimate for ``queryset`` where the backend exposes
+    one (PostgreSQL), otherwise a capped exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f"Falling back to a capped count, estimate failed: {e}")
+    return capped_count(queryset)
+
+
+def total_count(queryset, args=None, approximate=False):
+    """
+    Cheap totalCount for a connection queryset.
+
+    Unfiltered counts come from the signal-maintained counter table, filtered
+    counts from a short-TTL cache keyed by the normalised filter arguments.
+    Exact counts stop at ``CRM_COUNT_CAP``; ``approximate`` uses the planner
+    estimate instead.
+    """
+    model = queryset.model
+    if not queryset.query.has_filters():
+        return stored_count(model)
+    if approximate:
+        return estimate_count(queryset)
+
+    key = cache_key(model, args or {})
+    count = cache.get(key)
+    if count is None:
+        count = capped_count(queryset)
+        cache.set(key, count, count_cache_ttl())
+    return count
@@ -1,71 +1,49 @@
-import os
-from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import time
+from .jobs import execute
+from .joblog import get_log
 
 def log_crm_heartbeat():
     """
-    Log a heartbeat message to confirm CRM application health
-    and verify GraphQL endpoint is responsive
+    Log a heartbeat record to confirm CRM application health
+    and verify GraphQL endpoint is responsive, with its latency
     """
-    
-    # Get current timestamp in DD/MM/YYYY-HH:MM:SS format
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    log_file = "/tmp/crm_heartbeat_log.txt"
-    
-    # Base heartbeat message
-    heartbeat_msg = f"{timestamp} CRM is alive"
-    
-    # Try to query GraphQL hello field to verify endpoint is responsive
+
+    # Query the GraphQL hello field over HTTP whatever CRM_JOB_MODE is:
+    # an in-process run would report the app alive with the web tier down
+    mode = 'remote'
+    start = time.perf_counter()
     try:
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
-        # Query the hello field
-        query = gql("""
-            query {
-                hello
-            }
-        """)
-        
-        result = client.execute(query)
+        result = execute("query { hello }", mode=mode)
         hello_response = result.get('hello', 'No response')
-        
-        # Append GraphQL status to heartbeat message
-        heartbeat_msg += f" - GraphQL hello: {hello_response}"
-        
+        outcome = {'status': 'success', 'hello': hello_response}
+
     except Exception as e:
         # If GraphQL query fails, log the error but continue with heartbeat
-        heartbeat_msg += f" - GraphQL error: {str(e)}"
-    
-    # Append heartbeat message to log file
+        outcome = {'status': 'error', 'error': str(e)}
+
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    # Append the heartbeat to the crm_heartbeat job log
     try:
-        with open(log_file, 'a') as f:
-            f.write(heartbeat_msg + "\n")
+        with get_log('crm_heartbeat') as log:
+            log.record(message="CRM is alive", mode=mode, latency_ms=round(latency_ms, 1), **outcome)
     except Exception as e:
         # If logging fails, at least print to console
         print(f"Failed to write heartbeat log: {str(e)}")
-        print(heartbeat_msg)
+        print(f"CRM is alive - {outcome} ({mode}, {latency_ms:.1f} ms)")
 
 
 # Cron job to update low stock products
 def update_low_stock():
     """
-    Execute the UpdateLowStockProducts mutation via GraphQL endpoint
-    and log the results to /tmp/low_stock_updates_log.txt
+    Execute the UpdateLowStockProducts mutation (see crm.jobs for how it
+    is run) and log the outcome to the low_stock_update job log
     """
-        
-    # Get current timestamp in DD/MM/YYYY-HH:MM:SS format
-    timestamp = datetime.now().strftime('%d/%m/%Y-%H:%M:%S')
-    log_file = "/tmp/low_stock_updates_log.txt"
-    
+
+    log = get_log('low_stock_update')
     try:
-        # Set up GraphQL client
-        transport = RequestsHTTPTransport(url="http://localhost:8000/graphql")
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        
         # Define the mutation query
-        mutation_query = gql("""
+        mutation_query = """
             mutation {
                 updateLowStockProducts {
                     success
@@ -78,40 +56,26 @@ def update_low_stock():
                     }
                 }
             }
-        """)
-        
+        """
+
         # Execute the mutation
-        result = client.execute(mutation_query)
+        result = execute(mutation_query)
         mutation_result = result.get('updateLowStockProducts', {})
-        
-        # Prepare log message
-        log_message = f"[{timestamp}] Low Stock Update Job:\n"
-        log_message += f"  Success: {mutation_result.get('success', False)}\n"
-        log_message += f"  Message: {mutation_result.get('message', 'No message')}\n"
-        log_message += f"  Updated Count: {mutation_result.get('updatedCount', 0)}\n"
-        
-        # Log updated products details
-        updated_products = mutation_result.get('updatedProducts', [])
-        if updated_products:
-            log_message += "  Updated Products:\n"
-            for product in updated_products:
-                log_message += f"    - {product['name']} (ID: {product['id']}): Stock updated to {product['stock']}\n"
-        
-        log_message += "-" * 50 + "\n"
-        
-        # Write to log file
-        with open(log_file, 'a') as f:
-            f.write(log_message)
-            
+
+        # Record the outcome, with the updated products' new stock
+        log.record(
+            status='success' if mutation_result.get('success') else 'error',
+            message=mutation_result.get('message', 'No message'),
+            updated_count=mutation_result.get('updatedCount', 0),
+            updated_products=mutation_result.get('updatedProducts') or [],
+        )
+
     except Exception as e:
         # Log error if mutation fails
-        error_message = f"[{timestamp}] Low Stock Update Job ERROR: {str(e)}\n"
-        error_message += "-" * 50 + "\n"
-        
-        try:
-            with open(log_file, 'a') as f:
-                f.write(error_message)
-        except Exception as log_error:
-            # If logging fails, at least print to console
-            print(f"Failed to write error log: {str(log_error)}")
-            print(error_message)
\ No newline at end of file
+        log.record(status='error', error=str(e))
+
+    try:
+        log.flush()
+    except Exception as log_error:
+        # If logging fails, at least print to console
+        print(f"Failed to write low stock log: {str(log_error)}")
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import parse, print_schema
+from graphql.validation import validate
+
+from graphene_django.settings import graphene_settings
+
+APQ_CACHE_PREFIX = 'crm:apq:'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=8)
+def schema_version(schema):
+    """
+    Short fingerprint of a GraphQLSchema, so cached documents are never
+    reused against a schema they were not validated for.
+    """
+    return query_hash(print_schema(schema))[:16]
+
+
+class DocumentCache:
+    """
+    Bounded, thread-safe LRU of parsed and validated GraphQL documents keyed
+    by (schema version, query hash, validation rules).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persisted_hits = 0
+        self.persisted_misses = 0
+
+    def get(self, schema, query, validation_rules=None):
+        """
+        Return (document, validation_errors) for ``query``. Parse errors are
+        raised, and neither they nor invalid documents are cached, so junk
+        queries can't evict the good ones.
+        """
+        rules = tuple(validation_rules or ())
+        key = (schema_version(schema), query_hash(query), rules)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        document = parse(query)
+        errors = validate(schema, document, rules or None, graphene_settings.MAX_VALIDATION_ERRORS)
+        entry = (document, errors)
+        if errors:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_persisted_query(self, sha256):
+        """
+        Look up the text of an Automatic Persisted Query by its sha256.
+        """
+        query = cache.get(APQ_CACHE_PREFIX + sha256)
+        with self._lock:
+            if query is None:
+                self.persisted_misses += 1
+            else:
+                self.persisted_hits += 1
+        return query
+
+    def persist_query(self, sha256, query):
+        cache.set(APQ_CACHE_PREFIX + sha256, query, getattr(settings, 'CRM_PERSISTED_QUERY_TTL', 86400))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'persisted_hits': self.persisted_hits,
+                'persisted_misses': self.persisted_misses,
+            }
+
+
+document_cache = DocumentCache(getattr(settings, 'CRM_DOCUMENT_CACHE_SIZE', 256))
@@ -0,0 +1,157 @@
+import csv
+import json
+
+import graphene
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from graphene_django.filter import TypedFilter
+
+from .filters import CustomerFilter, OrderFilter
+from .models import Customer, Order, OrderLine
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_chunk_size():
+    return getattr(settings, 'CRM_EXPORT_CHUNK_SIZE', 2000)
+
+
+class Echo:
+    """
+    File-like object whose ``write`` returns the value instead of storing
+    it, so csv.writer can feed a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _customer_row(customer):
+    return {
+        'id': customer.pk,
+        'name': customer.name,
+        'email': customer.email,
+        'phone': customer.phone,
+        'created_at': customer.created_at,
+    }
+
+
+def _order_row(order):
+    return {
+        'id': order.pk,
+        'customer_id': order.customer_id,
+        'customer_name': order.customer.name,
+        'customer_email': order.customer.email,
+        'total_amount': order.total_amount,
+        'status': order.status,
+        'order_date': order.order_date,
+        'lines': [
+            {'product_id': line.product_id, 'quantity': line.quantity, 'unit_price': line.unit_price}
+            for line in order.lines.all()
+        ],
+    }
+
+
+def _orders():
+    lines = OrderLine.objects.only('order_id', 'product_id', 'quantity', 'unit_price').order_by('pk')
+    return (
+        Order.objects.select_related('customer')
+        .only('id', 'customer_id', 'customer__name', 'customer__email', 'total_amount', 'status', 'order_date')
+        .prefetch_related(Prefetch('lines', queryset=lines))
+    )
+
+
+# name: (filterset, base queryset, row builder, CSV columns)
+EXPORTS = {
+    'customers': (
+        CustomerFilter,
+        lambda: Customer.objects.only('id', 'name', 'email', 'phone', 'created_at'),
+        _customer_row,
+        ['id', 'name', 'email', 'phone', 'created_at'],
+    ),
+    'orders': (
+        OrderFilter,
+        _orders,
+        _order_row,
+        ['id', 'customer_id', 'customer_name', 'customer_email', 'total_amount', 'status', 'order_date', 'lines'],
+    ),
+}
+
+
+def filter_data(filterset_class, query):
+    """
+    Filter arguments from a query string. List filters (``product_ids_any``
+    and friends) take repeated parameters and/or comma separated values.
+    """
+    data = {}
+    for name, filter_ in filterset_class.base_filters.items():
+        if name not in query:
+            continue
+        if isinstance(filter_, TypedFilter) and isinstance(filter_.input_type, graphene.List):
+            values = [value for param in query.getlist(name) for value in param.split(',') if value.strip()]
+            try:
+                data[name] = [int(value) for value in values]
+            except ValueError:
+                raise ValueError(f"{name}: expected a list of integers.")
+        else:
+            data[name] = query[name]
+    return data
+
+
+def filtered_queryset(name, query):
+    """
+    The queryset to export for ``name`` with the filters in ``query``
+    applied, ordered by primary key. Raises ValueError for an unknown export
+    or invalid filter values.
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export '{name}'.")
+    filterset_class, base, _, _ = EXPORTS[name]
+    filterset = filterset_class(filter_data(filterset_class, query), queryset=base())
+    if not filterset.is_valid():
+        raise ValueError('; '.join(
+            f"{field}: {' '.join(messages)}" for field, messages in filterset.errors.items()
+        ))
+    return filterset.qs.order_by('pk')
+
+
+def _format_lines(lines):
+    return ';'.join(f"{line['product_id']}x{line['quantity']}@{line['unit_price']}" for line in lines)
+
+
+def stream_rows(name, queryset, fmt, chunk_size=None):
+    """
+    Yield the export of ``queryset`` as CSV or NDJSON text, a chunk of rows
+    at a time.
+
+    Rows are read with ``QuerySet.iterator`` (a server-side cursor where the
+    database supports one), so memory stays bounded by ``chunk_size`` rows
+    however large the export is.
+    """
+    chunk_size = chunk_size or export_chunk_size()
+    _, _, build_row, columns = EXPORTS[name]
+    writer = csv.writer(Echo())
+    if fmt == 'csv':
+        yield writer.writerow(columns)
+
+    buffer = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        row = build_row(obj)
+        if fmt == 'csv':
+            if 'lines' in row:
+                row['lines'] = _format_lines(row['lines'])
+            buffer.append(writer.writerow([
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in (row[column] for column in columns)
+            ]))
+        else:
+            buffer.append(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
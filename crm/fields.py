@@ -0,0 +1,72 @@
+from functools import partial
+
+from django.db.models import QuerySet
+from graphene_django.filter import DjangoFilterConnectionField
+from promise import Promise
+
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+from .pagination import keyset_connection, offset_connection
+
+# Key under which resolve_queryset hands the keyset columns to resolve_connection
+KEYSET_ARG = '_keyset'
+
+
+class CRMFilterConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField that shapes the filtered queryset to the
+    client's selection set and hands each resolved page to the per-request
+    loaders, so nested fields of the page's nodes are batched.
+
+    With ``keyset=('order_date', 'id')`` the connection is ordered by those
+    columns and ``after``/``before`` cursors seek on them instead of using
+    OFFSET. Offset cursors and the ``offset`` argument keep working, and
+    never count the whole result.
+    """
+
+    def __init__(self, *args, keyset=None, **kwargs):
+        self.keyset = tuple(keyset) if keyset else None
+        super().__init__(*args, **kwargs)
+
+    def get_queryset_resolver(self):
+        return partial(super().get_queryset_resolver(), keyset=self.keyset)
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, keyset=None, **kwargs):
+        queryset = super().resolve_queryset(connection, iterable, info, args, **kwargs)
+        if keyset:
+            queryset = queryset.order_by(*keyset)
+            args[KEYSET_ARG] = keyset
+        return optimize_queryset(queryset, info, columns=keyset or ())
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        keyset = args.pop(KEYSET_ARG, None)
+        filter_args = dict(args)
+        page = None
+        if keyset and not args.get('offset'):
+            page = keyset_connection(connection, iterable, args, keyset, max_limit=max_limit)
+        if page is None and isinstance(iterable, QuerySet):
+            page = offset_connection(connection, iterable, args, max_limit=max_limit)
+        if page is None:
+            page = super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+        # totalCount keys its cache on the filter arguments
+        page.filter_args = filter_args
+        return page
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+
+        def prime(resolved):
+            model = connection._meta.node._meta.model
+            get_loaders(info).prime(model, [edge.node for edge in resolved.edges])
+            return resolved
+
+        if Promise.is_thenable(result):
+            return Promise.resolve(result).then(prime)
+        return prime(result)
@@ -1,23 +1,53 @@
 import django_filters
-from .models import Customer, Product, Order
-from django.db.models import Q
+import graphene
+from graphene_django.filter import TypedFilter
+from .models import Customer, Product, Order, OrderLine
+from django.db.models import Exists, OuterRef, Q, Subquery, Sum
+from . import search
+from .phones import normalize_phone, prefix_range
+
+def search_filter(model, field, path='pk'):
+    """
+    Filter method answering a substring filter on ``model.field`` from the
+    search index; ``path`` leads from the filtered model to ``model``'s pk.
+    """
+    def filter_method(queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(**{f'{path}__in': search.matches(model, field, value)})
+    return filter_method
+
+def order_has_products(product_filter):
+    """
+    Correlated EXISTS over the order's lines, so matching several lines
+    never duplicates the order row.
+    """
+    return Exists(OrderLine.objects.filter(order=OuterRef('pk'), **product_filter))
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
-    email = django_filters.CharFilter(field_name='email', lookup_expr='icontains')
+    name = django_filters.CharFilter(method=search_filter(Customer, 'name'))
+    email = django_filters.CharFilter(method=search_filter(Customer, 'email'))
     created_at__gte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
 
     def filter_phone_pattern(self, queryset, name, value):
-        return queryset.filter(phone__startswith=value)
+        # Match the normalized prefix with a range, so the index is used
+        value = (value or '').strip()
+        if not value:
+            return queryset
+        prefix = '+' if value == '+' else normalize_phone(value)
+        if prefix is None:
+            return queryset.none()
+        low, high = prefix_range(prefix)
+        return queryset.filter(phone_normalized__gte=low, phone_normalized__lt=high)
 
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern']
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name = django_filters.CharFilter(method=search_filter(Product, 'name'))
     price__gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
@@ -32,10 +62,43 @@ class OrderFilter(django_filters.FilterSet):
     total_amount__lte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='lte')
     order_date__gte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='gte')
     order_date__lte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='lte')
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
-    product_id = django_filters.NumberFilter(field_name='products__id')
+    status = django_filters.ChoiceFilter(choices=Order.STATUS_CHOICES)
+    customer_name = django_filters.CharFilter(method=search_filter(Customer, 'name', 'customer_id'))
+    product_name = django_filters.CharFilter(method='filter_product_name')
+    product_id = django_filters.NumberFilter(method='filter_product_id')
+    product_ids_all = TypedFilter(input_type=graphene.List(graphene.Int), method='filter_product_ids_all')
+    product_ids_any = TypedFilter(input_type=graphene.List(graphene.Int), method='filter_product_ids_any')
+    units__gte = django_filters.NumberFilter(method='filter_units_gte')
+
+    def filter_product_name(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(order_has_products({'product_id__in': search.matches(Product, 'name', value)}))
+
+    def filter_product_id(self, queryset, name, value):
+        return queryset.filter(order_has_products({'product_id': value}))
+
+    def filter_product_ids_all(self, queryset, name, value):
+        # One indexed EXISTS probe per product
+        for product_id in set(value or ()):
+            queryset = queryset.filter(order_has_products({'product_id': product_id}))
+        return queryset
+
+    def filter_product_ids_any(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(order_has_products({'product_id__in': value}))
+
+    def filter_units_gte(self, queryset, name, value):
+        # Correlated subquery, so joins added by other filters can't inflate the sum
+        units = (
+            OrderLine.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(units=Sum('quantity'))
+            .values('units')
+        )
+        return queryset.annotate(units=Subquery(units)).filter(units__gte=value)
 
     class Meta:
         model = Order
-        fields = ['total_amount__gte', 'total_amount__lte', 'order_date__gte', 'order_date__lte', 'customer_name', 'product_name', 'product_id']
\ No newline at end of file
+        fields = ['total_amount__gte', 'total_amount__lte', 'order_date__gte', 'order_date__lte', 'status', 'customer_name', 'product_name', 'product_id', 'product_ids_all', 'product_ids_any', 'units__gte']
\ No newline at end of file
@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import json
+import logging
+import uuid
+
+from celery import Task
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = 'crm:lock:'
+IDEMPOTENCY_PREFIX = 'crm:idempotency:'
+
+# Connection attribute holding the keys whose result awaits a commit
+UNCOMMITTED_ATTR = 'crm_idempotency_uncommitted'
+
+
+class IdempotencyConflict(Exception):
+    """
+    An idempotency key was reused with other arguments, or while the
+    request that first used it is still running.
+    """
+
+
+def lock_cache():
+    """
+    The cache holding task locks and memoized mutation results:
+    ``CRM_LOCK_CACHE`` names a cache alias, so pointing it at a
+    DatabaseCache keeps them in the database instead.
+    """
+    return caches[getattr(settings, 'CRM_LOCK_CACHE', 'default')]
+
+
+def task_lock_ttl():
+    return getattr(settings, 'CRM_TASK_LOCK_TTL', 3600)
+
+
+def idempotency_ttl():
+    return getattr(settings, 'CRM_IDEMPOTENCY_TTL', 86400)
+
+
+def fingerprint(*args, **kwargs):
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def task_key(name, args=(), kwargs=None):
+    """
+    Lock key of task ``name`` called with ``args`` and ``kwargs``.
+    """
+    return f'{name}:{fingerprint(*args, **(kwargs or {}))}'
+
+
+def acquire(key, ttl=None):
+    """
+    Take the lock ``key`` for ``ttl`` seconds. Returns a token to release it
+    with, or None if the lock is already held. Relies on the cache's atomic
+    ``add``.
+    """
+    token = uuid.uuid4().hex
+    if lock_cache().add(LOCK_PREFIX + key, token, ttl or task_lock_ttl()):
+        return token
+    return None
+
+
+def release(key, token):
+    """
+    Release the lock ``key`` if it is still held with ``token`` (it may have
+    expired and been taken by someone else since).
+    """
+    cache = lock_cache()
+    if cache.get(LOCK_PREFIX + key) == token:
+        cache.delete(LOCK_PREFIX + key)
+
+
+def single_instance(ttl=None):
+    """
+    Decorator for Celery task functions: a call is skipped while another
+    call of the same task with the same arguments holds the lock, e.g. a
+    redelivered message or an overlapping beat run. Put it below
+    ``@shared_task``. Skipped calls return ``{'status': 'skipped'}``.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Bound tasks get the task as first argument; it is not part of the key
+            key_args = args[1:] if args and isinstance(args[0], Task) else args
+            key = task_key(name, key_args, kwargs)
+            token = acquire(key, ttl)
+            if token is None:
+                logger.info(f"Skipping {name}: already running with the same arguments")
+                return {'status': 'skipped', 'reason': 'duplicate'}
+            try:
+                return func(*args, **kwargs)
+            finally:
+                release(key, token)
+        return wrapper
+    return decorator
+
+
+def viewer_scope(info):
+    user = getattr(info.context, 'user', None)
+    if user is not None and user.is_authenticated:
+        return str(user.pk)
+    return 'anonymous'
+
+
+def _dump(value):
+    if isinstance(value, models.Model):
+        return {'model': value._meta.label, 'pk': value.pk}
+    if isinstance(value, (list, tuple)):
+        return [_dump(item) for item in value]
+    return value
+
+
+def dump_payload(payload):
+    """
+    The fields of a graphene mutation ``payload`` as plain data: model
+    instances are stored as (model, pk) references, so the cached entry
+    stays small and survives any cache serializer.
+    """
+    return {name: _dump(getattr(payload, name, None)) for name in type(payload)._meta.fields}
+
+
+def _references(value):
+    if isinstance(value, dict):
+        yield value['model'], value['pk']
+    elif isinstance(value, list):
+        for item in value:
+            yield from _references(item)
+
+
+def _load(value, instances):
+    if isinstance(value, dict):
+        return instances.get((value['model'], value['pk']))
+    if isinstance(value, list):
+        # Rows deleted since the first request drop out of lists
+        return [item for item in (_load(item, instances) for item in value) if item is not None]
+    return value
+
+
+def load_payload(payload_type, data):
+    """
+    Rebuild a ``payload_type`` stored by ``dump_payload``, reading the
+    referenced rows back with one query per model.
+    """
+    pks = {}
+    for label, pk in _references(list(data.values())):
+        pks.setdefault(label, set()).add(pk)
+    instances = {}
+    for label, model_pks in pks.items():
+        for pk, obj in apps.get_model(label).objects.in_bulk(model_pks).items():
+            instances[label, pk] = obj
+    return payload_type(**{name: _load(value, instances) for name, value in data.items()})
+
+
+def idempotent(scope, key, arguments, func):
+    """
+    Run ``func`` once per idempotency ``key`` within ``scope`` (mutation and
+    viewer) and memoize the payload it returns for ``CRM_IDEMPOTENCY_TTL``
+    seconds: repeating the request rebuilds the stored payload (see
+    ``dump_payload``) without running ``func`` again. Without a key,
+    ``func`` just runs.
+
+    Raises IdempotencyConflict if the key was used with different
+    ``arguments`` or its first request is still running. If ``func`` raises,
+    nothing is stored and the key can be retried.
+
+    The result is stored when the surrounding transaction commits (at once
+    in autocommit mode). If it rolls back instead, the key stays pending
+    until ``forget_uncommitted`` runs at the end of the request, after which
+    it can be retried.
+    """
+    if not key:
+        return func()
+    cache = lock_cache()
+    cache_key = IDEMPOTENCY_PREFIX + hashlib.sha256(f'{scope}:{key}'.encode('utf-8')).hexdigest()
+    request = fingerprint(arguments)
+
+    if not cache.add(cache_key, {'fingerprint': request, 'pending': True}, task_lock_ttl()):
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if entry['fingerprint'] != request:
+                raise IdempotencyConflict("Idempotency key was already used with different arguments.")
+            if entry.get('pending'):
+                raise IdempotencyConflict("A request with this idempotency key is still in progress.")
+            return load_payload(import_string(entry['type']), entry['result'])
+        # Expired in between; claim it again
+        if not cache.add(cache_key, {'fingerprint': request, 'pending': True}, task_lock_ttl()):
+            raise IdempotencyConflict("A request with this idempotency key is still in progress.")
+
+    try:
+        result = func()
+    except BaseException:
+        cache.delete(cache_key)
+        raise
+    payload_type = type(result)
+    entry = {
+        'fingerprint': request,
+        'type': f'{payload_type.__module__}.{payload_type.__qualname__}',
+        'result': dump_payload(result),
+    }
+    uncommitted = _uncommitted_keys(transaction.get_connection())
+    uncommitted.add(cache_key)
+
+    def remember():
+        uncommitted.discard(cache_key)
+        cache.set(cache_key, entry, idempotency_ttl())
+
+    transaction.on_commit(remember)
+    return result
+
+
+def _uncommitted_keys(connection):
+    keys = getattr(connection, UNCOMMITTED_ATTR, None)
+    if keys is None:
+        keys = set()
+        setattr(connection, UNCOMMITTED_ATTR, keys)
+    return keys
+
+
+def forget_uncommitted():
+    """
+    Release the idempotency keys whose request's transaction rolled back,
+    so they can be retried. Called when a request finishes.
+    """
+    for connection in connections.all(initialized_only=True):
+        keys = getattr(connection, UNCOMMITTED_ATTR, None)
+        if keys:
+            lock_cache().delete_many(list(keys))
+            keys.clear()
@@ -0,0 +1,116 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import response_cache
+from .bulk import bulk_chunk_size
+from .models import Product
+
+
+def restock_low_stock(threshold=10, increment=10, chunk_size=None, dry_run=False):
+    """
+    Add ``increment`` to the stock of every product below ``threshold``.
+
+    Products are walked in primary key order, ``chunk_size`` at a time, and
+    each chunk is restocked by one ``UPDATE ... SET stock = stock + N`` in its
+    own short transaction. With ``dry_run`` nothing is written.
+
+    Returns (count, ids): how many rows were (or would be) updated and their
+    primary keys.
+    """
+    chunk_size = chunk_size or bulk_chunk_size()
+    low_stock = Product.objects.filter(stock__lt=threshold).order_by('pk')
+    count, ids, last_pk = 0, [], None
+
+    while True:
+        chunk = low_stock if last_pk is None else low_stock.filter(pk__gt=last_pk)
+        chunk_ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not chunk_ids:
+            break
+        last_pk = chunk_ids[-1]
+        if dry_run:
+            count += len(chunk_ids)
+        else:
+            with transaction.atomic():
+                # Lock the chunk and re-check the threshold, so rows restocked
+                # concurrently are skipped and left out of ``ids``
+                chunk_ids = list(
+                    Product.objects.select_for_update()
+                    .filter(pk__in=chunk_ids, stock__lt=threshold)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)
+                )
+                count += Product.objects.filter(pk__in=chunk_ids).update(
+                    stock=F('stock') + increment, updated_at=timezone.now()
+                )
+        ids.extend(chunk_ids)
+
+    if count and not dry_run:
+        response_cache.invalidate_models(Product)
+    return count, ids
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a reservation cannot be satisfied; ``product_ids`` are the
+    products that did not have enough stock left.
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient stock for product IDs: {', '.join(map(str, product_ids))}")
+
+
+def reserve_retries():
+    return getattr(settings, 'CRM_STOCK_RESERVE_RETRIES', 3)
+
+
+def reserve_stock(lines):
+    """
+    Take ``quantity`` units of each product in ``lines`` ((product, quantity)
+    pairs). Must run inside a transaction.
+
+    Each product is decremented with a conditional ``UPDATE ... SET stock =
+    stock - qty WHERE stock >= qty``, so stock can never go negative and no
+    row is read-then-written. Rows are updated in primary key order, so
+    concurrent multi-product orders always take their row locks in the
+    same order and cannot deadlock each other.
+    """
+    quantities = {}
+    for product, quantity in lines:
+        quantities[product.pk] = quantities.get(product.pk, 0) + quantity
+
+    short = []
+    for pk in sorted(quantities):
+        quantity = quantities[pk]
+        reserved = Product.objects.filter(pk=pk, stock__gte=quantity).update(
+            stock=F('stock') - quantity, updated_at=timezone.now()
+        )
+        if not reserved:
+            short.append(pk)
+    if short:
+        # Roll back the decrements already made for this reservation
+        raise InsufficientStock(short)
+    response_cache.invalidate_models(Product)
+
+
+def with_retries(func, *args, retries=None, **kwargs):
+    """
+    Call ``func`` in a transaction, retrying it (with jittered exponential
+    backoff) when the database reports a lock timeout, deadlock or
+    serialization failure. Gives up after ``CRM_STOCK_RESERVE_RETRIES``
+    retries and re-raises.
+    """
+    retries = reserve_retries() if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
@@ -0,0 +1,303 @@
+import atexit
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not coordinated across processes
+    fcntl = None
+
+
+def job_log_dir():
+    return getattr(settings, 'CRM_JOB_LOG_DIR', '/tmp/crm_job_logs')
+
+
+def job_log_max_bytes():
+    return getattr(settings, 'CRM_JOB_LOG_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def job_log_rotate_seconds():
+    return getattr(settings, 'CRM_JOB_LOG_ROTATE_SECONDS', 86400)
+
+
+def job_log_backups():
+    return getattr(settings, 'CRM_JOB_LOG_BACKUPS', 7)
+
+
+def job_log_buffer_size():
+    return getattr(settings, 'CRM_JOB_LOG_BUFFER_SIZE', 100)
+
+
+def job_log_flush_interval():
+    return getattr(settings, 'CRM_JOB_LOG_FLUSH_INTERVAL', 5)
+
+
+def log_path(job):
+    return os.path.join(job_log_dir(), f'{job}.jsonl')
+
+
+def rotated_paths(job):
+    """
+    Compressed rotated files of ``job``, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(job_log_dir(), f'{job}.*.jsonl.gz')))
+
+
+def _first_timestamp(path):
+    try:
+        with open(path, 'rb') as f:
+            record = json.loads(f.readline())
+        return parse_datetime(record['ts'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+class JobLog:
+    """
+    JSON-lines log of one job (``<CRM_JOB_LOG_DIR>/<job>.jsonl``).
+
+    Records are buffered and appended in batches, when the buffer holds
+    ``CRM_JOB_LOG_BUFFER_SIZE`` records, at the latest
+    ``CRM_JOB_LOG_FLUSH_INTERVAL`` seconds after a record was buffered (a
+    timer thread flushes an idle log), on ``flush()``, when a ``with`` block
+    exits, or at interpreter exit. Each batch is one append under an exclusive ``flock``, so
+    concurrent writers in other processes never interleave lines. The file
+    is rotated once it would exceed ``CRM_JOB_LOG_MAX_BYTES`` or its first
+    record is older than ``CRM_JOB_LOG_ROTATE_SECONDS``; rotated files are
+    gzipped and the newest ``CRM_JOB_LOG_BACKUPS`` kept.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.path = log_path(job)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._timer = None
+        # (inode, time of its first record) of the current file
+        self._started = (None, None)
+
+    def record(self, status=None, **fields):
+        """
+        Buffer one record. ``status`` marks the outcome of a run ('success',
+        'error', 'skipped'); records without one are details of a run.
+        """
+        entry = {'ts': timezone.now().isoformat(), 'job': self.job, 'pid': os.getpid()}
+        if status is not None:
+            entry['status'] = status
+        entry.update(fields)
+        line = json.dumps(entry, cls=DjangoJSONEncoder) + '\n'
+        with self._lock:
+            self._buffer.append(line)
+            due = (
+                len(self._buffer) >= job_log_buffer_size()
+                or time.monotonic() - self._flushed_at >= job_log_flush_interval()
+            )
+            if not due and self._timer is None:
+                # Flush even if no further record comes to trigger it
+                self._timer = threading.Timer(job_log_flush_interval(), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self, fsync=False):
+        """
+        Append the buffered records. With ``fsync`` they are on disk when
+        this returns.
+        """
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._flushed_at = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if lines:
+                self._append(''.join(lines).encode('utf-8'), fsync)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+    def _open_locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                # Another process may have rotated the file while we waited
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _needs_rotation(self, fd, size):
+        stat = os.fstat(fd)
+        if not stat.st_size:
+            return False
+        if stat.st_size + size > job_log_max_bytes():
+            return True
+        if self._started[0] != stat.st_ino:
+            self._started = (stat.st_ino, _first_timestamp(self.path))
+        started = self._started[1]
+        return started is not None and (timezone.now() - started).total_seconds() > job_log_rotate_seconds()
+
+    def _append(self, data, fsync):
+        rotated = None
+        fd = self._open_locked()
+        try:
+            if self._needs_rotation(fd, len(data)):
+                rotated = f"{self.path[:-len('.jsonl')]}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.jsonl"
+                os.rename(self.path, rotated)
+                os.close(fd)
+                fd = self._open_locked()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        if rotated is not None:
+            # Compress outside the lock; only this process knows the name
+            self._compress(rotated)
+
+    def _compress(self, path):
+        with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(path)
+        backups = rotated_paths(self.job)
+        for old in backups[:max(len(backups) - job_log_backups(), 0)]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_log(job):
+    """
+    The JobLog of ``job`` for this process. Buffered records are flushed
+    at interpreter exit.
+    """
+    with _logs_lock:
+        log = _logs.get(job)
+        if log is None:
+            log = _logs[job] = JobLog(job)
+    return log
+
+
+@atexit.register
+def flush_all():
+    for log in list(_logs.values()):
+        log.flush()
+
+
+def _forget_timers():
+    # Timer threads don't survive a fork (e.g. into a Celery pool worker)
+    for log in _logs.values():
+        log._timer = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_timers)
+
+
+# Reader API
+
+def jobs():
+    """
+    Names of the jobs that have a log.
+    """
+    names = (os.path.basename(path)[:-len('.jsonl')] for path in glob.glob(os.path.join(job_log_dir(), '*.jsonl')))
+    # Skip rotated files not compressed yet
+    return sorted(name for name in names if '.' not in name)
+
+
+def _parse(lines):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # A line cut short by a crash
+            continue
+
+
+def read_records(job, rotated=False):
+    """
+    Yield the records of ``job``, oldest first, including the rotated files
+    when ``rotated`` is true.
+    """
+    if rotated:
+        for path in rotated_paths(job):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                yield from _parse(f)
+    try:
+        with open(log_path(job), encoding='utf-8') as f:
+            yield from _parse(f)
+    except FileNotFoundError:
+        return
+
+
+def tail(job, n=20):
+    """
+    The last ``n`` records of ``job``, read backwards from the end of the
+    current file.
+    """
+    try:
+        f = open(log_path(job), 'rb')
+    except FileNotFoundError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position and data.count(b'\n') <= n:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return list(_parse(data.splitlines()[-n:])) if n else []
+
+
+def summarize(since=None, job_names=None):
+    """
+    Outcomes of each job's runs since ``since`` (a datetime; all of the
+    current file by default): run count, count per status, and the last
+    status, time and error.
+    """
+    summary = {}
+    for job in job_names or jobs():
+        outcome = {'job': job, 'runs': 0, 'statuses': {}, 'last_status': None, 'last_run': None, 'last_error': None}
+        for record in read_records(job, rotated=since is not None):
+            status = record.get('status')
+            if status is None:
+                continue
+            at = parse_datetime(record.get('ts', ''))
+            if since is not None and (at is None or at < since):
+                continue
+            outcome['runs'] += 1
+            outcome['statuses'][status] = outcome['statuses'].get(status, 0) + 1
+            outcome['last_status'], outcome['last_run'] = status, at
+            if status == 'error':
+                outcome['last_error'] = record.get('error') or record.get('message')
+        summary[job] = outcome
+    return summary
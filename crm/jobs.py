@@ -0,0 +1,109 @@
+import requests
+from django.conf import settings
+from graphql.error import GraphQLError
+from requests.adapters import HTTPAdapter
+
+from .document_cache import document_cache
+
+
+class JobError(Exception):
+    """
+    A scheduled job's GraphQL operation failed or returned errors.
+    """
+
+
+def job_mode():
+    return getattr(settings, 'CRM_JOB_MODE', 'local')
+
+
+def graphql_url():
+    return getattr(settings, 'CRM_GRAPHQL_URL', 'http://localhost:8000/graphql')
+
+
+def job_http_timeout():
+    return getattr(settings, 'CRM_JOB_HTTP_TIMEOUT', 10)
+
+
+def _schema():
+    # Imported lazily: graphql_crm.schema imports crm.schema
+    from graphql_crm.schema import schema
+    return schema
+
+
+class LocalRunner:
+    """
+    Executes operations against ``graphql_crm.schema.schema`` in this
+    process: no HTTP round trip, no introspection, and no dependency on the
+    web tier being up.
+    """
+
+    name = 'local'
+
+    def execute(self, query, variables=None):
+        result = _schema().execute(query, variable_values=variables)
+        if result.errors:
+            raise JobError('; '.join(str(error) for error in result.errors))
+        return result.data
+
+
+class RemoteRunner:
+    """
+    Posts operations to ``CRM_GRAPHQL_URL`` over one pooled keep-alive
+    session per process. Documents are validated against the local schema
+    (cached by the document cache) instead of introspecting the server.
+    """
+
+    name = 'remote'
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def execute(self, query, variables=None):
+        try:
+            _, errors = document_cache.get(_schema().graphql_schema, query)
+        except GraphQLError as e:
+            raise JobError(e.message) from e
+        if errors:
+            raise JobError('; '.join(error.message for error in errors))
+        try:
+            response = self.session.post(
+                graphql_url(),
+                json={'query': query, 'variables': variables or {}},
+                timeout=job_http_timeout(),
+            )
+            response.raise_for_status()
+            payload = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise JobError(str(e)) from e
+        if payload.get('errors'):
+            raise JobError('; '.join(error.get('message', '') for error in payload['errors']))
+        return payload.get('data')
+
+
+RUNNERS = {runner.name: runner for runner in (LocalRunner, RemoteRunner)}
+
+_runners = {}
+
+
+def get_runner(mode=None):
+    """
+    The runner for ``mode`` (``CRM_JOB_MODE`` by default), shared by every
+    job run in this process.
+    """
+    mode = mode or job_mode()
+    runner = _runners.get(mode)
+    if runner is None:
+        runner = _runners[mode] = RUNNERS[mode]()
+    return runner
+
+
+def execute(query, variables=None, mode=None):
+    """
+    Run a GraphQL operation for a scheduled job and return its data. Raises
+    JobError if it fails.
+    """
+    return get_runner(mode).execute(query, variables)
+
@@ -0,0 +1,278 @@
+import asyncio
+from collections import defaultdict
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+
+from .models import Customer, Order, OrderLine
+
+CONTEXT_ATTR = '_crm_loaders'
+
+
+class DataLoader:
+    """
+    Per-request batching loader.
+
+    Keys are queued with ``prime`` as soon as a parent list is resolved, so the
+    first ``load`` fetches every sibling key with a single ``IN`` query instead
+    of one query per node. Results are cached for the rest of the request.
+
+    Called from async execution, ``load`` returns an awaitable instead: keys
+    requested by concurrently running resolvers are coalesced into one
+    ``abatch_load`` call.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._cache = {}
+        self._queue = {}
+        self._batch = None
+
+    def batch_load(self, keys):
+        """
+        Return a dict mapping each found key to its value.
+        """
+        raise NotImplementedError
+
+    async def abatch_load(self, keys):
+        return await sync_to_async(self.batch_load)(keys)
+
+    def default(self):
+        return None
+
+    def is_cached(self, key):
+        return key in self._cache
+
+    def prime(self, keys):
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._queue[key] = None
+
+    def prime_values(self, values):
+        for key, value in values.items():
+            self._cache[key] = value
+            self._queue.pop(key, None)
+
+    def load(self, key):
+        if in_event_loop():
+            return self.aload(key)
+        if key is None:
+            return self.default()
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        if in_event_loop():
+            return asyncio.gather(*(self.aload(key) for key in keys))
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        keys = self._take_queue()
+        return self._store(keys, self.batch_load(keys))
+
+    async def aload(self, key):
+        if key is None:
+            return self.default()
+        while key not in self._cache:
+            self._queue[key] = None
+            if self._batch is None:
+                self._batch = asyncio.ensure_future(self._adispatch())
+            # A key queued after the running batch took its keys loops
+            # once more and rides on the next batch.
+            await asyncio.shield(self._batch)
+        return self._cache[key]
+
+    async def _adispatch(self):
+        # Yield once so sibling resolvers can queue their keys first
+        await asyncio.sleep(0)
+        self._batch = None
+        keys = self._take_queue()
+        if keys:
+            self._store(keys, await self.abatch_load(keys))
+
+    def _take_queue(self):
+        keys = list(self._queue)
+        self._queue.clear()
+        return keys
+
+    def _store(self, keys, results):
+        for key in keys:
+            self._cache[key] = results.get(key, self.default())
+        return results
+
+
+class OrderCustomerLoader(DataLoader):
+    """
+    customer_id -> Customer
+    """
+
+    def batch_load(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        self.loaders.prime(Customer, customers.values())
+        return customers
+
+    async def abatch_load(self, keys):
+        customers = await Customer.objects.ain_bulk(keys)
+        self.loaders.prime(Customer, customers.values())
+        return customers
+
+
+class OrderLinesLoader(DataLoader):
+    """
+    order_id -> [OrderLine], with each line's product joined in.
+    """
+
+    def default(self):
+        return []
+
+    def rows(self, keys):
+        return (
+            OrderLine.objects
+            .filter(order_id__in=keys)
+            .select_related('product')
+            .order_by('order_id', 'id')
+        )
+
+    def batch_load(self, keys):
+        return self._grouped(keys, list(self.rows(keys)))
+
+    async def abatch_load(self, keys):
+        return self._grouped(keys, [row async for row in self.rows(keys)])
+
+    def _grouped(self, keys, rows):
+        lines = {key: [] for key in keys}
+        for row in rows:
+            lines[row.order_id].append(row)
+        # The lines and the products of an order come from the same rows
+        self.loaders.order_lines.prime_values(lines)
+        self.loaders.order_products.prime_values(
+            {order_id: [line.product for line in group] for order_id, group in lines.items()}
+        )
+        return {key: self._cache[key] for key in keys}
+
+
+class OrderProductsLoader(OrderLinesLoader):
+    """
+    order_id -> [Product], read through the order lines.
+    """
+
+
+class CustomerOrdersLoader(DataLoader):
+    """
+    customer_id -> [Order]
+    """
+
+    def default(self):
+        return []
+
+    def rows(self, keys):
+        return Order.objects.filter(customer_id__in=keys).order_by('id')
+
+    def batch_load(self, keys):
+        orders = defaultdict(list)
+        for order in self.rows(keys):
+            orders[order.customer_id].append(order)
+        return self._primed(orders)
+
+    async def abatch_load(self, keys):
+        orders = defaultdict(list)
+        async for order in self.rows(keys):
+            orders[order.customer_id].append(order)
+        return self._primed(orders)
+
+    def _primed(self, orders):
+        self.loaders.prime(Order, [o for group in orders.values() for o in group])
+        return orders
+
+
+class Loaders:
+    """
+    The set of loaders shared by every resolver of one GraphQL execution.
+    """
+
+    def __init__(self):
+        self.order_customer = OrderCustomerLoader(self)
+        self.order_products = OrderProductsLoader(self)
+        self.order_lines = OrderLinesLoader(self)
+        self.customer_orders = CustomerOrdersLoader(self)
+
+    def prime(self, model, objects):
+        """
+        Queue the child keys of freshly resolved ``objects`` so the next level
+        of the query is fetched in one batch. Relations the queryset already
+        joined or prefetched are copied into the cache instead.
+        """
+        objects = list(objects)
+        if not objects:
+            return
+        if model is Order:
+            customers = [
+                o.customer for o in objects
+                if Order.customer.is_cached(o) and not self.order_customer.is_cached(o.customer_id)
+            ]
+            self.prime(Customer, customers)
+            lines = _prefetched(objects, 'lines')
+            self.order_lines.prime_values(lines)
+            # As in OrderLinesLoader, the products of an order come from its
+            # lines when their product was joined in
+            products = _prefetched(objects, 'products')
+            products.update(
+                (order_id, [line.product for line in group])
+                for order_id, group in lines.items()
+                if all(OrderLine.product.is_cached(line) for line in group)
+            )
+            self.order_products.prime_values(products)
+            self.order_products.prime(o.pk for o in objects)
+            self.order_lines.prime(o.pk for o in objects)
+            self.order_customer.prime(o.customer_id for o in objects)
+        elif model is Customer:
+            self.order_customer.prime_values({c.pk: c for c in objects})
+            prefetched = _prefetched(objects, 'orders')
+            self.customer_orders.prime_values(prefetched)
+            self.prime(Order, [o for group in prefetched.values() for o in group])
+            self.customer_orders.prime(c.pk for c in objects)
+
+
+def _prefetched(objects, name):
+    """
+    {pk: [related]} for the objects whose ``name`` relation was prefetched.
+    """
+    return {
+        obj.pk: list(obj._prefetched_objects_cache[name])
+        for obj in objects
+        if name in getattr(obj, '_prefetched_objects_cache', {})
+    }
+
+
+def in_event_loop():
+    """
+    True while resolving under async execution, where the sync ORM must not be called.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def get_loaders(info):
+    """
+    Return the loaders bound to the current execution, creating them on first use.
+    """
+    context = info.context
+    if isinstance(context, dict):
+        return context.setdefault(CONTEXT_ATTR, Loaders())
+    loaders = getattr(context, CONTEXT_ATTR, None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, CONTEXT_ATTR, loaders)
+    return loaders
+
+
+def new_context():
+    """
+    Context used when the schema is executed directly rather than through a view.
+    """
+    return SimpleNamespace()
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.rollup import backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup for a range of days (default: every day with orders)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='end', help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        if start and end and start > end:
+            raise CommandError("--from must not be after --to")
+
+        days = backfill(start, end)
+        if not days:
+            self.stdout.write("No orders to roll up")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(days)} days ({days[0]} to {days[-1]})"))
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+DEFAULT_QUERY = """
+query {
+  allOrders(first: 20) {
+    edges {
+      node {
+        totalAmount
+        customer { name email }
+        products { name price }
+      }
+    }
+  }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent GraphQL throughput of the sync (WSGI) and async (ASGI) views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per run")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once")
+        parser.add_argument('--query', default=DEFAULT_QUERY, help="GraphQL query to send")
+        parser.add_argument('--sync-path', default='/graphql')
+        parser.add_argument('--async-path', default='/graphql/async')
+
+    def handle(self, *args, **options):
+        body = json.dumps({'query': options['query']})
+        total, concurrency = options['requests'], options['concurrency']
+
+        sync_elapsed, sync_failed = self.run_sync(options['sync_path'], body, total, concurrency)
+        self.report("WSGI", options['sync_path'], total, sync_elapsed, sync_failed)
+
+        async_elapsed, async_failed = asyncio.run(
+            self.run_async(options['async_path'], body, total, concurrency)
+        )
+        self.report("ASGI", options['async_path'], total, async_elapsed, async_failed)
+
+    def report(self, label, path, total, elapsed, failed):
+        self.stdout.write(
+            f"{label} {path}: {total} requests in {elapsed:.2f}s "
+            f"({total / elapsed:.1f} req/s, {failed} failed)"
+        )
+
+    def run_sync(self, path, body, total, concurrency):
+        def send(_):
+            response = Client().post(path, body, content_type='application/json')
+            return response.status_code == 200
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, range(total)))
+        return time.perf_counter() - start, results.count(False)
+
+    async def run_async(self, path, body, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send():
+            async with semaphore:
+                response = await client.post(path, body, content_type='application/json')
+                return response.status_code == 200
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(send() for _ in range(total)))
+        return time.perf_counter() - start, results.count(False)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from crm.joblog import get_log
+from crm.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders in the last year, reporting to the customer_cleanup job log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help="Inactivity window in days (default 365)")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        with get_log('customer_cleanup') as log:
+            try:
+                inactive = Customer.objects.exclude(
+                    id__in=Order.objects.filter(order_date__gte=since).values('customer_id')
+                )
+                deleted = inactive.count()
+                inactive.delete()
+            except Exception as e:
+                log.record(status='error', error=str(e))
+                raise
+            log.record(status='success', deleted=deleted, since=since)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} inactive customers"))
@@ -0,0 +1,43 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm import joblog
+
+
+class Command(BaseCommand):
+    help = "Summarize recent cron and Celery job outcomes, or tail one job's log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', nargs='?', help="Job name (default: every job)")
+        parser.add_argument('--tail', type=int, help="Print the last N records of the job instead")
+        parser.add_argument('--hours', type=float, default=24, help="Summarize runs of the last N hours (default 24)")
+
+    def handle(self, *args, **options):
+        job = options['job']
+        if job is not None and job not in joblog.jobs():
+            raise CommandError(f"No log for job '{job}' in {joblog.job_log_dir()}")
+
+        if options['tail'] is not None:
+            if job is None:
+                raise CommandError("--tail needs a job name")
+            for record in joblog.tail(job, options['tail']):
+                self.stdout.write(json.dumps(record))
+            return
+
+        since = timezone.now() - timedelta(hours=options['hours'])
+        summary = joblog.summarize(since=since, job_names=[job] if job else None)
+        if not summary:
+            self.stdout.write("No job logs yet")
+            return
+        for outcome in summary.values():
+            statuses = ', '.join(f"{status}: {count}" for status, count in sorted(outcome['statuses'].items()))
+            line = f"{outcome['job']}: {outcome['runs']} runs ({statuses or 'none'})"
+            if outcome['last_run'] is not None:
+                line += f", last {outcome['last_status']} at {outcome['last_run'].isoformat()}"
+            style = self.style.ERROR if outcome['last_status'] == 'error' else self.style.SUCCESS
+            self.stdout.write(style(line))
+            if outcome['last_error']:
+                self.stdout.write(f"  last error: {outcome['last_error']}")
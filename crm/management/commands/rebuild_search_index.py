@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from crm.search import SEARCH_FIELDS, get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the customer and product search index from the source tables"
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        for model in SEARCH_FIELDS:
+            backend.rebuild(model)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the {backend.name} search index"))
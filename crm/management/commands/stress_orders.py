@@ -0,0 +1,85 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crm.models import Customer, Order, Product
+from crm.schema import schema
+
+CREATE_ORDER = """
+mutation ($customerId: ID!, $productIds: [ID]!) {
+  createOrder(customerId: $customerId, productIds: $productIds) {
+    order { id }
+    message
+  }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many concurrent createOrder mutations at a few scarce products, "
+        "check that no stock was oversold and report throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=300, help="createOrder calls to make")
+        parser.add_argument('--concurrency', type=int, default=32, help="Calls in flight at once")
+        parser.add_argument('--products', type=int, default=3, help="Products in every order")
+        parser.add_argument('--stock', type=int, default=100, help="Initial stock of each product")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated rows")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        customer = Customer.objects.create(name=f"Stress {tag}", email=f"stress-{tag}@example.com")
+        products = [
+            Product.objects.create(name=f"Stress {tag} #{i}", price=Decimal('1.00'), stock=options['stock'])
+            for i in range(options['products'])
+        ]
+        product_ids = [str(product.pk) for product in products]
+
+        def create_order(_):
+            # Shuffle so lock ordering, not request order, prevents deadlocks
+            ids = random.sample(product_ids, len(product_ids))
+            try:
+                result = schema.execute(CREATE_ORDER, variable_values={
+                    'customerId': str(customer.pk),
+                    'productIds': ids,
+                })
+                if result.errors:
+                    return 'error'
+                return 'created' if result.data['createOrder']['order'] else 'rejected'
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(create_order, range(options['orders'])))
+        elapsed = time.perf_counter() - start
+
+        created = outcomes.count('created')
+        orders = Order.objects.filter(customer=customer).count()
+        stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+        oversold = [
+            pk for pk, left in stock.items()
+            if left < 0 or options['stock'] - left != created
+        ]
+
+        self.stdout.write(
+            f"{options['orders']} createOrder calls in {elapsed:.2f}s "
+            f"({options['orders'] / elapsed:.1f} req/s): {created} created, "
+            f"{outcomes.count('rejected')} out of stock, {outcomes.count('error')} failed"
+        )
+        self.stdout.write(f"Stock left: {stock}, orders stored: {orders}")
+
+        if not options['keep']:
+            customer.delete()
+            Product.objects.filter(pk__in=product_ids).delete()
+
+        if oversold or orders != created or created > options['stock']:
+            raise CommandError(f"Stock accounting is inconsistent for products {oversold or product_ids}")
+        self.stdout.write(self.style.SUCCESS("No stock was oversold"))
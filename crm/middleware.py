@@ -0,0 +1,17 @@
+from asgiref.sync import sync_to_async
+
+
+class SyncRootFieldMiddleware:
+    """
+    GraphQL middleware for async execution.
+
+    Root query and mutation resolvers use the sync ORM (filtersets, counts,
+    transaction.atomic), so they run in Django's database thread via
+    ``sync_to_async`` while the event loop keeps serving other requests.
+    Nested relations are resolved by the loaders' async path.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if info.path.prev is None and not info.field_name.startswith('__'):
+            return sync_to_async(next)(root, info, **args)
+        return next(root, info, **args)
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_order_products(apps, schema_editor):
+    """
+    One line per existing order/product pair, priced at the product's
+    current price (the price paid was never recorded).
+    """
+    Order = apps.get_model('crm', 'Order')
+    OrderLine = apps.get_model('crm', 'OrderLine')
+    OldLink = Order.products.through
+    rows = OldLink.objects.select_related('product').order_by('pk').iterator(chunk_size=2000)
+    batch = []
+    for row in rows:
+        batch.append(OrderLine(
+            order_id=row.order_id,
+            product_id=row.product_id,
+            quantity=1,
+            unit_price=row.product.price,
+        ))
+        if len(batch) >= 2000:
+            OrderLine.objects.bulk_create(batch)
+            batch = []
+    OrderLine.objects.bulk_create(batch)
+
+
+def copy_order_lines(apps, schema_editor):
+    Order = apps.get_model('crm', 'Order')
+    OrderLine = apps.get_model('crm', 'OrderLine')
+    OldLink = Order.products.through
+    OldLink.objects.bulk_create(
+        [OldLink(order_id=order_id, product_id=product_id)
+         for order_id, product_id in OrderLine.objects.values_list('order_id', 'product_id')],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_modelcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='crm.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='crm.product')),
+            ],
+        ),
+        migrations.RunPython(copy_order_products, copy_order_lines),
+        # Django cannot add ``through`` to an existing M2M, so the field is
+        # recreated on top of OrderLine once the rows have been copied
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(related_name='orders', through='crm.OrderLine', to='crm.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='crm_orderline_order_product_uniq'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Mirrors crm.search.SEARCH_FIELDS at the time of this migration
+SEARCH_TABLES = {
+    'crm_search_customer': ('crm_customer', ('name', 'email')),
+    'crm_search_product': ('crm_product', ('name',)),
+}
+
+TRIGRAM_INDEXES = {
+    'crm_customer_name_trgm': ('crm_customer', 'name'),
+    'crm_customer_email_trgm': ('crm_customer', 'email'),
+    'crm_product_name_trgm': ('crm_product', 'name'),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table, (source, fields) in SEARCH_TABLES.items():
+            columns = ', '.join(fields)
+            try:
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, tokenize='trigram')"
+                )
+            except Exception:
+                # No FTS5 or no trigram tokenizer (SQLite < 3.34): crm.search
+                # falls back to icontains
+                return
+            schema_editor.execute(f"INSERT INTO {table} (rowid, {columns}) SELECT id, {columns} FROM {source}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, (table, column) in TRIGRAM_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table in SEARCH_TABLES:
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+    elif vendor == 'postgresql':
+        for name in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
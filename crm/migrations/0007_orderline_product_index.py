@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['product', 'order'], name='crm_orderline_prod_order_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:49
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone):
+    # Frozen copy of crm.phones.normalize_phone
+    if not phone:
+        return None
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub('', phone)
+    if not digits:
+        return None
+    if phone.startswith('+'):
+        return '+' + digits
+    return '+' + getattr(settings, 'CRM_DEFAULT_PHONE_COUNTRY_CODE', '1') + digits
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Customer = apps.get_model('crm', 'Customer')
+    customers = Customer.objects.exclude(phone__isnull=True).exclude(phone='').only('pk', 'phone')
+    batch = []
+    for customer in customers.order_by('pk').iterator(chunk_size=2000):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['phone_normalized'])
+            batch = []
+    Customer.objects.bulk_update(batch, ['phone_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_orderline_product_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+    ]
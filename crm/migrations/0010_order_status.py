@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_updated_at_and_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='watermark',
+            name='position_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'order_date', 'id'], name='crm_order_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Django's PostgreSQL icontains compiles to UPPER(col::text) LIKE UPPER(%s),
+# which the raw-column indexes of 0006 can't serve; index that expression
+TRIGRAM_INDEXES = {
+    'crm_customer_name_trgm': ('crm_customer', 'name'),
+    'crm_customer_email_trgm': ('crm_customer', 'email'),
+    'crm_product_name_trgm': ('crm_product', 'name'),
+}
+
+
+def index_upper_expressions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, (table, column) in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+        schema_editor.execute(
+            f"CREATE INDEX {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def index_raw_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, (table, column) in TRIGRAM_INDEXES.items():
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+        schema_editor.execute(f"CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_order_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_upper_expressions, index_raw_columns),
+    ]
@@ -5,15 +5,135 @@ class Customer(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # E.164 form of phone, maintained on save (see crm.phones)
+    phone_normalized = models.CharField(max_length=20, blank=True, null=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+            # The change feed seeks on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='crm_customer_updated_id_idx'),
+        ]
 
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The change feed seeks on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='crm_product_updated_id_idx'),
+        ]
 
 class Order(models.Model):
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (COMPLETED, 'Completed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through='OrderLine', related_name='orders')
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    order_date = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    order_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (order_date, id)
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            # Order reminders seek on (order_date, id) among orders of one status
+            models.Index(fields=['status', 'order_date', 'id'], name='crm_order_status_date_idx'),
+            # The change feed seeks on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='crm_order_updated_id_idx'),
+        ]
+
+class OrderLine(models.Model):
+    """
+    One product of an order, with the quantity ordered and the unit price at
+    the time of ordering, so revenue can be aggregated in SQL.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_lines')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Also the (order_id, product_id) index for order -> product lookups
+            models.UniqueConstraint(fields=['order', 'product'], name='crm_orderline_order_product_uniq'),
+        ]
+        indexes = [
+            # product -> order lookups (product filters, sales by product)
+            models.Index(fields=['product', 'order'], name='crm_orderline_prod_order_idx'),
+        ]
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+class ModelCounter(models.Model):
+    """
+    Row count per model, kept current by post_save/post_delete signals so
+    unfiltered totalCount never needs a COUNT(*).
+    """
+    label = models.CharField(max_length=100, unique=True)
+    count = models.BigIntegerField(default=0)
+
+class Watermark(models.Model):
+    """
+    How far an incremental job has got, e.g. the last order id folded into
+    the sales rollup. Jobs that walk a (timestamp, id) keyset also store the
+    timestamp in ``position_at``.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    position_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class DailySalesRollup(models.Model):
+    """
+    Sales totals of one day, rebuilt from Order/OrderLine rows by crm.rollup.
+    """
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    customers = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+class DailyProductSales(models.Model):
+    """
+    Units and revenue of one product on one day.
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='crm_dailyproductsales_day_product_uniq'),
+        ]
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted Customer, Product or Order, so the change feed can
+    report deletes.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='crm_tombstone_deleted_id_idx'),
+        ]
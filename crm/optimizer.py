@@ -0,0 +1,110 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+# Selection path from a connection field down to its node type
+CONNECTION_NODE_PATH = ('edges', 'node')
+
+# Stop following relations past this depth; deeper levels fall back to the loaders
+MAX_DEPTH = 3
+
+
+def selected_fields(info, nodes):
+    """
+    Merge the sub-selections of ``nodes`` into {field name: [FieldNode]},
+    expanding named and inline fragments.
+    """
+    fields = {}
+    for node in nodes:
+        if node.selection_set is None:
+            continue
+        for selection in node.selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+                nested = selected_fields(info, [fragment]) if fragment else {}
+            elif isinstance(selection, InlineFragmentNode):
+                nested = selected_fields(info, [selection])
+            else:
+                continue
+            for name, field_nodes in nested.items():
+                fields.setdefault(name, []).extend(field_nodes)
+    return fields
+
+
+def connection_node_fields(info):
+    """
+    Return the fields requested on ``edges { node { ... } }`` of the current connection field.
+    """
+    nodes = info.field_nodes
+    for name in CONNECTION_NODE_PATH:
+        nodes = selected_fields(info, nodes).get(name, [])
+    return selected_fields(info, nodes)
+
+
+class QueryPlan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = []
+        self.prefetch_related = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def _plan(model, info, fields, prefix, plan, depth):
+    # The primary key and foreign key columns are always loaded: they are
+    # cheap and the loaders key on them.
+    plan.only.update(
+        prefix + f.name for f in model._meta.concrete_fields if f.primary_key or f.is_relation
+    )
+    for name, nodes in fields.items():
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            continue
+
+        if not field.is_relation:
+            plan.only.add(prefix + field.name)
+        elif depth >= MAX_DEPTH:
+            continue
+        elif field.many_to_one or (field.one_to_one and field.concrete):
+            path = prefix + field.name
+            plan.select_related.append(path)
+            _plan(field.related_model, info, selected_fields(info, nodes), path + '__', plan, depth + 1)
+        elif field.many_to_many or field.one_to_many:
+            accessor = field.get_accessor_name() if field.auto_created else field.name
+            related = optimize_queryset(
+                field.related_model._default_manager.all(),
+                info,
+                selected_fields(info, nodes),
+                depth + 1,
+            )
+            plan.prefetch_related.append(Prefetch(prefix + accessor, queryset=related))
+
+
+def optimize_queryset(queryset, info, fields=None, depth=0, columns=()):
+    """
+    Add select_related / prefetch_related / only() to ``queryset`` based on the
+    GraphQL fields the client selected, so unused joins and columns are never fetched.
+
+    ``fields`` defaults to the node selection of the connection field being
+    resolved; ``columns`` are loaded regardless (e.g. keyset cursor columns).
+    """
+    if fields is None:
+        fields = connection_node_fields(info)
+    if not fields:
+        return queryset
+    plan = QueryPlan()
+    plan.only.update(columns)
+    _plan(queryset.model, info, fields, '', plan, depth)
+    return plan.apply(queryset)
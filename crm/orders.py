@@ -0,0 +1,147 @@
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import counts, response_cache
+from .inventory import InsufficientStock, reserve_stock, with_retries
+from .models import Customer, Order, OrderLine, Product
+
+
+def _pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def order_lines(product_ids, products):
+    """
+    Turn the requested ``product_ids`` into (product, quantity) lines, a
+    repeated ID counting as one more unit of that product.
+
+    ``products`` maps pk to Product (as returned by ``in_bulk``). Returns
+    (lines, invalid_ids), keeping the order the IDs were first requested in.
+    """
+    # Keyed by pk, so "1" and "01" are the same product; IDs that are not
+    # integers keep their text and are reported as invalid
+    quantities = Counter(
+        str(pid) if _pk(pid) is None else _pk(pid) for pid in product_ids
+    )
+    lines, invalid = [], []
+    for pid, quantity in quantities.items():
+        product = products.get(pid)
+        if product is None:
+            invalid.append(str(pid))
+        else:
+            lines.append((product, quantity))
+    return lines, invalid
+
+
+def order_total(lines):
+    return sum((product.price * quantity for product, quantity in lines), Decimal('0.00'))
+
+
+def build_lines(order, lines):
+    """
+    OrderLine rows for ``lines``, snapshotting each product's current price.
+    """
+    return [
+        OrderLine(order=order, product=product, quantity=quantity, unit_price=product.price)
+        for product, quantity in lines
+    ]
+
+
+def fetch_products(product_ids):
+    """
+    All Products referenced by ``product_ids`` in a single query.
+    """
+    pks = {_pk(pid) for pid in product_ids} - {None}
+    return Product.objects.in_bulk(pks) if pks else {}
+
+
+def invalid_ids_message(invalid):
+    if len(invalid) == 1:
+        return f"Invalid product ID: {invalid[0]}"
+    return f"Invalid product IDs: {', '.join(invalid)}"
+
+
+def place_order(customer, lines, order_date=None):
+    """
+    Reserve the stock for ``lines`` and create the order. Must run inside
+    a transaction; raises InsufficientStock (rolling the reservation back)
+    when a product has run out.
+    """
+    reserve_stock(lines)
+    order = Order(customer=customer, total_amount=order_total(lines), order_date=order_date or datetime.now())
+    order.save()
+    OrderLine.objects.bulk_create(build_lines(order, lines))
+    return order
+
+
+def _insert_orders(pending):
+    orders, pending_lines, errors = [], [], []
+    for idx, customer, lines, order_date in pending:
+        try:
+            with transaction.atomic():
+                reserve_stock(lines)
+        except InsufficientStock as e:
+            errors.append((idx, f"Order {idx}: {e}"))
+            continue
+        orders.append(Order(
+            customer=customer,
+            total_amount=order_total(lines),
+            order_date=order_date or datetime.now(),
+        ))
+        pending_lines.append(lines)
+
+    if orders:
+        Order.objects.bulk_create(orders)
+        OrderLine.objects.bulk_create([
+            line
+            for order, lines in zip(orders, pending_lines)
+            for line in build_lines(order, lines)
+        ])
+        # bulk_create sends no post_save signals
+        counts.adjust(Order, len(orders))
+    return orders, errors
+
+
+def create_orders(requests):
+    """
+    Create many orders at once: customers and products are fetched with one
+    ``in_bulk`` each, and orders and their product rows are inserted with
+    ``bulk_create``, all in one transaction. Each order reserves its stock
+    in a savepoint, so an order that runs out of stock is rejected alone.
+
+    ``requests`` is a list of (customer_id, product_ids, order_date). Returns
+    (orders, errors) with one message per rejected request.
+    """
+    customers = Customer.objects.in_bulk(
+        {pk for pk in (_pk(customer_id) for customer_id, _, _ in requests) if pk is not None}
+    )
+    products = fetch_products([pid for _, product_ids, _ in requests for pid in product_ids])
+
+    pending, errors = [], []
+    for idx, (customer_id, product_ids, order_date) in enumerate(requests, start=1):
+        customer = customers.get(_pk(customer_id))
+        if customer is None:
+            errors.append((idx, f"Order {idx}: Invalid customer ID."))
+            continue
+        if not product_ids:
+            errors.append((idx, f"Order {idx}: At least one product must be selected."))
+            continue
+        lines, invalid = order_lines(product_ids, products)
+        if invalid:
+            errors.append((idx, f"Order {idx}: {invalid_ids_message(invalid)}"))
+            continue
+        pending.append((idx, customer, lines, order_date))
+
+    orders = []
+    if pending:
+        orders, stock_errors = with_retries(_insert_orders, pending)
+        errors.extend(stock_errors)
+        if orders:
+            response_cache.invalidate_models(Order)
+    return orders, [message for _, message in sorted(errors)]
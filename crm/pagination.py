@@ -0,0 +1,163 @@
+import base64
+import json
+from functools import partial
+
+from django.db.models import Q
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphql_relay import connection_from_array_slice, cursor_to_offset, get_offset_with_default, offset_to_cursor
+
+from . import counts
+
+KEYSET_PREFIX = 'keyset'
+
+
+def encode_cursor(obj, columns):
+    """
+    Opaque cursor holding the keyset values of ``obj``, e.g. (order_date, id).
+    """
+    values = []
+    for column in columns:
+        value = getattr(obj, column)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    payload = json.dumps([KEYSET_PREFIX] + values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, model, columns):
+    """
+    Return the keyset values stored in ``cursor``, or None if it is not a
+    keyset cursor (e.g. an offset cursor issued before keyset mode was enabled).
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if not isinstance(payload, list) or payload[:1] != [KEYSET_PREFIX]:
+        return None
+    values = payload[1:]
+    if len(values) != len(columns):
+        return None
+    return [model._meta.get_field(column).to_python(value) for column, value in zip(columns, values)]
+
+
+def seek(columns, values, forward=True):
+    """
+    Expand ``(c1, c2) > (v1, v2)`` into ``c1 >= v1 AND (c1 > v1 OR (c1 = v1 AND c2 > v2))``.
+
+    The leading ``c1 >= v1`` term keeps the predicate a range scan on the
+    composite index on every backend, row-value comparison support or not.
+    """
+    op = 'gt' if forward else 'lt'
+    condition = Q()
+    for i, column in enumerate(columns):
+        equal = dict(zip(columns[:i], values[:i]))
+        condition |= Q(**equal, **{f'{column}__{op}': values[i]})
+    return Q(**{f'{columns[0]}__{op}e': values[0]}) & condition
+
+
+def keyset_connection(connection, queryset, args, columns, max_limit=None):
+    """
+    Build a relay connection page by seeking on ``columns`` instead of OFFSET,
+    so page N costs the same as page 1. ``queryset`` must already be ordered
+    by ``columns`` ascending, and the last column must be unique.
+
+    Returns None when the cursors are not keyset cursors, so the caller can
+    fall back to offset pagination.
+    """
+    model = queryset.model
+    after, before = args.get('after'), args.get('before')
+    first, last = args.get('first'), args.get('last')
+    if first is None and last is None:
+        first = max_limit
+
+    page = queryset
+    if after:
+        values = decode_cursor(after, model, columns)
+        if values is None:
+            return None
+        page = page.filter(seek(columns, values, forward=True))
+    if before:
+        values = decode_cursor(before, model, columns)
+        if values is None:
+            return None
+        page = page.filter(seek(columns, values, forward=False))
+
+    if last is not None and first is None:
+        page = page.reverse()
+        rows = list(page[:last + 1])
+        has_previous, has_next = len(rows) > last, bool(before)
+        rows = list(reversed(rows[:last]))
+    else:
+        rows = list(page[:first + 1]) if first is not None else list(page)
+        has_next = first is not None and len(rows) > first
+        has_previous = bool(after)
+        rows = rows[:first] if first is not None else rows
+        if last is not None:
+            has_previous = has_previous or len(rows) > last
+            rows = rows[-last:] if last else []
+
+    edges = [connection.Edge(node=row, cursor=encode_cursor(row, columns)) for row in rows]
+    result = connection_adapter(
+        connection,
+        edges=edges,
+        pageInfo=page_info_adapter(
+            startCursor=edges[0].cursor if edges else None,
+            endCursor=edges[-1].cursor if edges else None,
+            hasPreviousPage=has_previous,
+            hasNextPage=has_next,
+        ),
+    )
+    result.iterable = queryset
+    return result
+
+
+def offset_connection(connection, queryset, args, max_limit=None):
+    """
+    Offset pagination as graphene-django does it, without its COUNT(*) of
+    the whole result: the count stops one row past the end of the page,
+    which is enough for ``hasNextPage``. ``last`` without ``first`` counts
+    up to the ``before`` cursor, or every row when there is none: the page
+    is taken from the end, so the count must be exact.
+
+    The page's ``length`` is set only when the count was exact, so
+    totalCount can reuse it.
+    """
+    offset = args.pop('offset', None)
+    after = args.get('after')
+    if offset:
+        if after:
+            offset += cursor_to_offset(after) + 1
+        # offset starts at 1, cursors at 0
+        args['after'] = offset_to_cursor(offset - 1)
+    if max_limit is not None and args.get('first') is None and args.get('last') is None:
+        args['first'] = max_limit
+
+    start = get_offset_with_default(args.get('after'), -1) + 1
+    first = args.get('first')
+    if first is not None:
+        bound = start + max(first, 0) + 1
+        length = counts.capped_count(queryset, cap=bound)
+        exact = length < bound
+    elif get_offset_with_default(args.get('before'), None) is not None:
+        # Rows past the cursor don't change the page
+        bound = get_offset_with_default(args['before'], None)
+        length = counts.capped_count(queryset, cap=bound) if bound > 0 else 0
+        exact = length < bound
+    else:
+        length = queryset.count()
+        exact = True
+
+    start = min(start, length)
+    result = connection_from_array_slice(
+        queryset[start:],
+        args,
+        slice_start=start,
+        array_length=length,
+        array_slice_length=length - start,
+        connection_type=partial(connection_adapter, connection),
+        edge_type=connection.Edge,
+        page_info_type=page_info_adapter,
+    )
+    result.iterable = queryset
+    result.length = length if exact else None
+    return result
@@ -0,0 +1,40 @@
+import re
+
+from django.conf import settings
+
+PHONE_PATTERN = re.compile(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$")
+_NON_DIGITS = re.compile(r"\D")
+
+
+def default_country_code():
+    return getattr(settings, 'CRM_DEFAULT_PHONE_COUNTRY_CODE', '1')
+
+
+def valid_phone(phone):
+    return not phone or PHONE_PATTERN.match(phone) is not None
+
+
+def normalize_phone(phone, country_code=None):
+    """
+    E.164-style form of ``phone``: ``+`` and digits only. Numbers written
+    without a leading ``+`` (e.g. ``123-456-7890``) are national numbers and
+    get ``CRM_DEFAULT_PHONE_COUNTRY_CODE`` prepended. Returns None when there
+    are no digits.
+    """
+    if not phone:
+        return None
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub('', phone)
+    if not digits:
+        return None
+    if phone.startswith('+'):
+        return '+' + digits
+    return '+' + (country_code or default_country_code()) + digits
+
+
+def prefix_range(prefix):
+    """
+    [low, high) bounds matching every string that starts with ``prefix``,
+    so a prefix lookup is an index range scan on any backend.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Order, Watermark
+from .pagination import seek
+
+WATERMARK = 'order_reminders'
+
+
+def reminder_chunk_size():
+    return getattr(settings, 'CRM_REMINDER_CHUNK_SIZE', 1000)
+
+
+def reminder_window():
+    return timedelta(days=getattr(settings, 'CRM_REMINDER_WINDOW_DAYS', 7))
+
+
+def reminder_lag():
+    return timedelta(seconds=getattr(settings, 'CRM_REMINDER_LAG', 60))
+
+
+def pending_orders(after, until, chunk_size):
+    """
+    Yield lists of at most ``chunk_size`` pending orders placed after the
+    (order_date, id) position ``after`` and before ``until``, oldest first.
+    Each chunk is one range scan on the (status, order_date, id) index, so
+    the cost per chunk does not grow with the number of open orders.
+    """
+    orders = (
+        Order.objects.filter(status=Order.PENDING, order_date__lt=until)
+        .order_by('order_date', 'id')
+        .values_list('id', 'order_date', 'customer__email', 'status', named=True)
+    )
+    while True:
+        chunk = list(orders.filter(seek(('order_date', 'id'), after))[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after = (chunk[-1].order_date, chunk[-1].id)
+
+
+def send_reminders(write, now=None, chunk_size=None):
+    """
+    Pass the pending orders of the last ``CRM_REMINDER_WINDOW_DAYS`` that
+    were not reminded on an earlier run to ``write``, one chunk at a time.
+
+    The (order_date, id) of the last order handled is persisted after each
+    chunk, so a rerun starts where the previous one stopped and never
+    reminds an order twice; only a chunk interrupted between ``write`` and
+    the watermark update can be repeated. Orders younger than
+    ``CRM_REMINDER_LAG`` are left for the next run so one whose transaction
+    commits late is not skipped. Returns the number of orders reminded.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or reminder_chunk_size()
+    watermark, _ = Watermark.objects.get_or_create(name=WATERMARK)
+
+    start = (now - reminder_window(), 0)
+    after = start
+    if watermark.position_at is not None:
+        after = max(start, (watermark.position_at, watermark.position))
+
+    sent = 0
+    for chunk in pending_orders(after, now - reminder_lag(), chunk_size):
+        write(chunk)
+        last = chunk[-1]
+        Watermark.objects.filter(pk=watermark.pk).update(
+            position_at=last.order_date, position=last.id, updated_at=timezone.now()
+        )
+        sent += len(chunk)
+    return sent
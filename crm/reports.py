@@ -0,0 +1,126 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum
+
+from . import counts
+from .models import Customer, Order, OrderLine
+
+CENTS = Decimal('0.01')
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+)
+
+
+def _lines(since=None, until=None):
+    lines = OrderLine.objects.all()
+    if since is not None:
+        lines = lines.filter(order__order_date__gte=since)
+    if until is not None:
+        lines = lines.filter(order__order_date__lt=until)
+    return lines
+
+
+def top_products(limit=10, since=None, until=None):
+    """
+    Best selling products by revenue, as one GROUP BY over the order lines.
+    """
+    return list(
+        _lines(since, until)
+        .values('product_id')
+        .annotate(units=Sum('quantity'), revenue=Sum(LINE_TOTAL), orders=Count('order_id'))
+        .order_by('-revenue', 'product_id')[:limit]
+    )
+
+
+def top_customers(limit=10, since=None, until=None):
+    """
+    Customers by total spend, as one GROUP BY over the order lines.
+    """
+    return list(
+        _lines(since, until)
+        .values(customer_id=F('order__customer_id'))
+        .annotate(spent=Sum(LINE_TOTAL), orders=Count('order_id', distinct=True))
+        .order_by('-spent', 'customer_id')[:limit]
+    )
+
+
+def crm_stats(since=None, until=None):
+    """
+    Headline numbers for orders placed in [since, until), computed with a
+    handful of aggregate queries whatever the number of orders. Revenue is
+    the exact Decimal sum of the order totals.
+    """
+    orders = Order.objects.all()
+    customers = Customer.objects.all()
+    if since is not None:
+        orders = orders.filter(order_date__gte=since)
+        customers = customers.filter(created_at__gte=since)
+    if until is not None:
+        orders = orders.filter(order_date__lt=until)
+        customers = customers.filter(created_at__lt=until)
+
+    stats = orders.aggregate(
+        orders=Count('id'),
+        revenue=Sum('total_amount'),
+        active_customers=Count('customer_id', distinct=True),
+    )
+    revenue = (stats['revenue'] or Decimal('0')).quantize(CENTS)
+    windowed = since is not None or until is not None
+    return {
+        'customers': customers.count() if windowed else counts.stored_count(Customer),
+        'active_customers': stats['active_customers'],
+        'orders': stats['orders'],
+        'revenue': revenue,
+        'average_order_value': (revenue / stats['orders']).quantize(CENTS) if stats['orders'] else Decimal('0.00'),
+        'units': _lines(since, until).aggregate(units=Sum('quantity'))['units'] or 0,
+    }
+
+
+def report_shard_size():
+    return getattr(settings, 'CRM_REPORT_SHARD_SIZE', 50000)
+
+
+def order_shards(shard_size=None):
+    """
+    Split the orders into [low, high) primary key ranges of ``shard_size``
+    ids each, for computing a report in parallel.
+    """
+    shard_size = shard_size or report_shard_size()
+    bounds = Order.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    return [
+        (low, min(low + shard_size, bounds['high'] + 1))
+        for low in range(bounds['low'], bounds['high'] + 1, shard_size)
+    ]
+
+
+def shard_stats(low, high):
+    """
+    Partial report aggregates of the orders with ids in [low, high). Partials
+    of disjoint shards add up, see ``merge_shard_stats``.
+    """
+    stats = Order.objects.filter(id__gte=low, id__lt=high).aggregate(orders=Count('id'), revenue=Sum('total_amount'))
+    units = OrderLine.objects.filter(order_id__gte=low, order_id__lt=high).aggregate(units=Sum('quantity'))['units']
+    return {
+        'orders': stats['orders'],
+        'revenue': (stats['revenue'] or Decimal('0')).quantize(CENTS),
+        'units': units or 0,
+    }
+
+
+def merge_shard_stats(partials):
+    """
+    Combine ``shard_stats`` results into totals for all orders.
+    """
+    orders = sum(partial['orders'] for partial in partials)
+    revenue = sum((Decimal(partial['revenue']) for partial in partials), Decimal('0')).quantize(CENTS)
+    return {
+        'customers': counts.stored_count(Customer),
+        'orders': orders,
+        'revenue': revenue,
+        'average_order_value': (revenue / orders).quantize(CENTS) if orders else Decimal('0.00'),
+        'units': sum(partial['units'] for partial in partials),
+    }
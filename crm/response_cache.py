@@ -0,0 +1,116 @@
+import hashlib
+import json
+import re
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from graphql import print_ast
+
+from .models import Customer, Order, OrderLine, Product
+
+RESPONSE_CACHE_PREFIX = 'crm:response:'
+TAG_CACHE_PREFIX = 'crm:tag:'
+
+# Models whose changes invalidate cached responses
+TAGGED_MODELS = (Customer, Product, Order)
+
+_IDENTIFIER = re.compile(r'["`](\w+)["`]')
+_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def _table_tags():
+    tags = {model._meta.db_table: model.__name__ for model in TAGGED_MODELS}
+    # Order lines belong to their order
+    tags[OrderLine._meta.db_table] = Order.__name__
+    return tags
+
+
+class TableTracker:
+    """
+    ``connection.execute_wrapper`` that records which tagged models the SQL
+    run during one GraphQL execution read from and wrote to.
+    """
+
+    def __init__(self):
+        self.tables = _table_tags()
+        self.read = set()
+        self.written = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        tags = {self.tables[name] for name in _IDENTIFIER.findall(sql) if name in self.tables}
+        if sql.lstrip().upper().startswith(_WRITE_STATEMENTS):
+            self.written |= tags
+        else:
+            self.read |= tags
+        return execute(sql, params, many, context)
+
+
+def tag_key(tag):
+    return TAG_CACHE_PREFIX + tag
+
+
+def tag_versions(tags=None):
+    """
+    Current version of each tag. A missing (or evicted) tag gets a fresh
+    version, which invalidates every response stored against the old one.
+    """
+    tags = [model.__name__ for model in TAGGED_MODELS] if tags is None else list(tags)
+    versions = cache.get_many([tag_key(tag) for tag in tags])
+    result = {}
+    for tag in tags:
+        version = versions.get(tag_key(tag))
+        if version is None:
+            cache.add(tag_key(tag), time.time_ns(), None)
+            version = cache.get(tag_key(tag))
+        result[tag] = version
+    return result
+
+
+def invalidate(*tags):
+    """
+    Bump the version of ``tags`` once the current transaction commits.
+    """
+    def bump():
+        for tag in tags:
+            cache.set(tag_key(tag), time.time_ns(), None)
+
+    if tags:
+        transaction.on_commit(bump)
+
+
+def invalidate_models(*models):
+    invalidate(*{model.__name__ for model in models if model in TAGGED_MODELS})
+
+
+def cache_key(schema_version, document, operation_name, variables, viewer):
+    """
+    Key for a read operation: the normalised (printed) document, the
+    operation name, the variables and the viewer.
+    """
+    payload = json.dumps(
+        [schema_version, print_ast(document), operation_name, variables or {}, viewer],
+        sort_keys=True,
+        default=str,
+    )
+    return RESPONSE_CACHE_PREFIX + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def lookup(key):
+    """
+    Return the cached response data for ``key`` if none of its tags changed since it was stored.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    tags = entry['tags']
+    if tag_versions(tags) != tags:
+        return None
+    return entry['data']
+
+
+def store(key, data, tags, versions, timeout):
+    """
+    Store ``data`` tagged with the ``versions`` of ``tags`` seen before execution started.
+    """
+    cache.set(key, {'data': data, 'tags': {tag: versions[tag] for tag in tags}}, timeout)
@@ -0,0 +1,118 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySalesRollup, Order, OrderLine, Watermark
+from .reports import LINE_TOTAL
+
+WATERMARK = 'daily_sales_rollup'
+
+
+def rollup_lag():
+    return timedelta(seconds=getattr(settings, 'CRM_ROLLUP_LAG', 300))
+
+
+def day_bounds(day):
+    """
+    [start, end) of ``day`` in the current time zone.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rebuild_day(day):
+    """
+    Recompute the rollup rows of ``day`` from its orders. Idempotent; a day
+    without orders has its rows removed.
+    """
+    start, end = day_bounds(day)
+    orders = Order.objects.filter(order_date__gte=start, order_date__lt=end)
+    lines = OrderLine.objects.filter(order__order_date__gte=start, order__order_date__lt=end)
+    totals = orders.aggregate(
+        orders=Count('id'),
+        revenue=Sum('total_amount'),
+        customers=Count('customer_id', distinct=True),
+    )
+    products = list(
+        lines.values('product_id').annotate(units=Sum('quantity'), revenue=Sum(LINE_TOTAL))
+    )
+
+    with transaction.atomic():
+        DailyProductSales.objects.filter(day=day).delete()
+        if not totals['orders']:
+            DailySalesRollup.objects.filter(day=day).delete()
+            return None
+        rollup, _ = DailySalesRollup.objects.update_or_create(day=day, defaults={
+            'orders': totals['orders'],
+            'revenue': totals['revenue'] or Decimal('0.00'),
+            'customers': totals['customers'],
+            'units': sum(row['units'] for row in products),
+        })
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(day=day, product_id=row['product_id'], units=row['units'], revenue=row['revenue'])
+            for row in products
+        ])
+    return rollup
+
+
+def update_rollup():
+    """
+    Fold orders created since the persisted watermark into the rollup.
+
+    Only the days those orders fall on are rebuilt. Orders younger than
+    ``CRM_ROLLUP_LAG`` are left for the next run, so an order whose
+    transaction commits late (with a lower id) is not skipped. Returns the
+    list of rebuilt days.
+    """
+    watermark, _ = Watermark.objects.get_or_create(name=WATERMARK)
+    cutoff = timezone.now() - rollup_lag()
+    new_orders = Order.objects.filter(pk__gt=watermark.position)
+
+    settled = new_orders.filter(order_date__lt=cutoff)
+    last_id = settled.aggregate(last_id=Max('id'))['last_id']
+    if last_id is None:
+        return []
+    days = sorted(set(
+        settled.annotate(day=TruncDate('order_date')).values_list('day', flat=True).distinct()
+    ))
+    for day in days:
+        rebuild_day(day)
+
+    # Don't move past an unsettled order; its day is rebuilt on a later run
+    first_recent = new_orders.filter(order_date__gte=cutoff).aggregate(first_id=Min('id'))['first_id']
+    if first_recent is not None:
+        last_id = min(last_id, first_recent - 1)
+    Watermark.objects.filter(pk=watermark.pk).update(position=max(last_id, watermark.position))
+    return days
+
+
+def backfill(start=None, end=None):
+    """
+    Rebuild the rollup for [start, end] (both dates, defaulting to the first
+    and last order), returning the days that had orders. Also the way to pick up deleted or edited orders, which
+    the incremental update does not see. A full backfill moves the
+    watermark past every order it covered.
+    """
+    bounds = Order.objects.aggregate(first=Min('order_date'), last=Max('order_date'), last_id=Max('id'))
+    if bounds['first'] is None:
+        return []
+    full = start is None and end is None
+    start = start or timezone.localdate(bounds['first'])
+    end = end or timezone.localdate(bounds['last'])
+
+    orders = Order.objects.filter(order_date__gte=day_bounds(start)[0], order_date__lt=day_bounds(end)[1])
+    days = sorted(set(orders.annotate(day=TruncDate('order_date')).values_list('day', flat=True).distinct()))
+    # Days left without orders just lose their rows
+    DailySalesRollup.objects.filter(day__gte=start, day__lte=end).exclude(day__in=days).delete()
+    DailyProductSales.objects.filter(day__gte=start, day__lte=end).exclude(day__in=days).delete()
+    for day in days:
+        rebuild_day(day)
+
+    if full:
+        Watermark.objects.update_or_create(name=WATERMARK, defaults={'position': bounds['last_id']})
+    return days
@@ -1,27 +1,61 @@
 from decimal import Decimal
 import graphene
 from graphene_django import DjangoObjectType
-from .models import Customer, Product, Order
+from .models import Customer, Product, Order, OrderLine, DailySalesRollup, DailyProductSales
 from django.db import transaction
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
-import re
-from datetime import datetime
+from django.core.exceptions import ObjectDoesNotExist
 from graphene import relay
-from graphene_django.filter import DjangoFilterConnectionField
+from .fields import CRMFilterConnectionField
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from asgiref.sync import sync_to_async
+from .loaders import get_loaders, in_event_loop, new_context
+from . import changes, counts, reports, search
+from .cost import CostExecutionContext
+from .optimizer import selected_fields
+from .bulk import import_customers
+from .phones import valid_phone
+from .inventory import InsufficientStock, restock_low_stock, with_retries
+from .orders import create_orders, fetch_products, invalid_ids_message, order_lines, place_order
+from .idempotency import IdempotencyConflict, idempotent, viewer_scope
 
 # GraphQL Types
+class CountableConnection(relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(
+        approximate=graphene.Boolean(default_value=False),
+        description="Number of matching rows. Exact counts stop at CRM_COUNT_CAP; "
+                    "approximate returns the database's estimate instead.",
+    )
+
+    def resolve_total_count(self, info, approximate=False):
+        # Offset pagination already counted a result that ended on its page
+        if getattr(self, 'length', None) is not None:
+            return self.length
+        args = (self.iterable, getattr(self, 'filter_args', None), approximate)
+        if in_event_loop():
+            return sync_to_async(counts.total_count)(*args)
+        return counts.total_count(*args)
+
 class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
         fields = ("id", "name", "email", "phone", "created_at")
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
+
+    orders = graphene.List(lambda: OrderType)
+
+    def resolve_orders(self, info):
+        return get_loaders(info).customer_orders.load(self.pk)
 
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
         fields = ("id", "name", "price", "stock")
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
 
     # Override the price field to handle Decimal conversion
     price = graphene.Float()
@@ -29,24 +63,122 @@ class ProductType(DjangoObjectType):
     def resolve_price(self, info):
         return float(self.price)
 
+class OrderLineType(DjangoObjectType):
+    class Meta:
+        model = OrderLine
+        fields = ("product", "quantity", "unit_price")
+
+    unit_price = graphene.Float()
+    line_total = graphene.Float()
+
+    def resolve_unit_price(self, info):
+        return float(self.unit_price)
+
+    def resolve_line_total(self, info):
+        return float(self.line_total)
+
 class OrderType(DjangoObjectType):
     class Meta:
         model = Order
-        fields = ("id", "customer", "products", "total_amount", "order_date")
+        fields = ("id", "customer", "products", "total_amount", "status", "order_date")
         interfaces = (relay.Node, )
+        connection_class = CountableConnection
 
     # Override products to return a simple list instead of connection
     products = graphene.List(ProductType)
+    lines = graphene.List(OrderLineType)
 
     # Override total_amount to handle Decimal conversion
     total_amount = graphene.Float()
 
+    def resolve_customer(self, info):
+        return get_loaders(info).order_customer.load(self.customer_id)
+
     def resolve_products(self, info):
-        return self.products.all()
+        return get_loaders(info).order_products.load(self.pk)
+
+    def resolve_lines(self, info):
+        return get_loaders(info).order_lines.load(self.pk)
     
     def resolve_total_amount(self, info):
         return float(self.total_amount)
 
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    units = graphene.Int()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+
+class SearchResult(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType)
+
+class SearchHitType(graphene.ObjectType):
+    score = graphene.Float(description="Relevance; higher is better")
+    node = graphene.Field(SearchResult)
+
+class ChangedNode(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType, OrderType)
+
+class ChangeType(graphene.ObjectType):
+    kind = graphene.String(description="crm.Customer, crm.Product or crm.Order")
+    object_id = graphene.ID(description="Database id of the changed row")
+    deleted = graphene.Boolean()
+    changed_at = graphene.DateTime()
+    node = graphene.Field(ChangedNode, description="Current state; null for deletes")
+    cursor = graphene.String()
+
+    def resolve_kind(self, info):
+        return self.obj.model if self.deleted else self.obj._meta.label
+
+    def resolve_object_id(self, info):
+        return self.obj.object_id if self.deleted else self.obj.pk
+
+    def resolve_changed_at(self, info):
+        return self.timestamp
+
+    def resolve_node(self, info):
+        return None if self.deleted else self.obj
+
+class ChangesPageType(graphene.ObjectType):
+    changes = graphene.List(ChangeType)
+    end_cursor = graphene.String(description="Pass as since to resume after this page")
+    has_more = graphene.Boolean()
+
+class CRMStatsType(graphene.ObjectType):
+    customers = graphene.Int(description="Customers created in the window (all customers without one)")
+    active_customers = graphene.Int(description="Customers who ordered in the window")
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+    units = graphene.Int()
+
+class DailyProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+class DailySalesType(graphene.ObjectType):
+    day = graphene.Date()
+    orders = graphene.Int()
+    revenue = graphene.Decimal()
+    customers = graphene.Int()
+    units = graphene.Int()
+    products = graphene.List(DailyProductSalesType)
+
+    def resolve_products(self, info):
+        # Product rows of every requested day were fetched in one query
+        return self.product_sales
+
+class CustomerSpendType(graphene.ObjectType):
+    customer = graphene.Field(CustomerType)
+    orders = graphene.Int()
+    spent = graphene.Decimal()
+
+    def resolve_customer(self, info):
+        return get_loaders(info).order_customer.load(self.customer_id)
+
 # Input Types
 class CustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -68,39 +200,61 @@ class CreateCustomer(graphene.Mutation):
     def mutate(self, info, input):
         if Customer.objects.filter(email=input.email).exists():
             return CreateCustomer(message="Email already exists.")
-        if input.phone:
-            phone_pattern = r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$"
-            if not re.match(phone_pattern, input.phone):
-                return CreateCustomer(message="Invalid phone format.")
+        if not valid_phone(input.phone):
+            return CreateCustomer(message="Invalid phone format.")
         customer = Customer(name=input.name, email=input.email, phone=input.phone)
         customer.save()
         return CreateCustomer(customer=customer, message="Customer created successfully.")
 
+IDEMPOTENCY_KEY_DESCRIPTION = "Client-chosen key; repeating the request with it returns the first result instead of writing again"
+
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         input = graphene.List(CustomerInput, required=True)
+        chunk_size = graphene.Int(description="Rows per existence check and bulk insert")
+        idempotency_key = graphene.String(description=IDEMPOTENCY_KEY_DESCRIPTION)
 
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
     @classmethod
-    def mutate(cls, root, info, input):
-        customers = []
-        errors = []
-        with transaction.atomic():
-            for idx, data in enumerate(input):
-                if Customer.objects.filter(email=data.email).exists():
-                    errors.append(f"Row {idx+1}: Email already exists.")
-                    continue
-                if data.phone:
-                    phone_pattern = r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$"
-                    if not re.match(phone_pattern, data.phone):
-                        errors.append(f"Row {idx+1}: Invalid phone format.")
-                        continue
-                customer = Customer(name=data.name, email=data.email, phone=data.phone)
-                customer.save()
-                customers.append(customer)
-        return BulkCreateCustomers(customers=customers, errors=errors)
+    def mutate(cls, root, info, input, chunk_size=None, idempotency_key=None):
+        def create():
+            with transaction.atomic():
+                customers, errors = import_customers(input, chunk_size=chunk_size)
+            return BulkCreateCustomers(customers=customers, errors=errors)
+
+        try:
+            return idempotent(f'bulkCreateCustomers:{viewer_scope(info)}', idempotency_key, input, create)
+        except IdempotencyConflict as e:
+            return BulkCreateCustomers(customers=[], errors=[str(e)])
+
+class StartCustomerImport(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(CustomerInput, required=True)
+        chunk_size = graphene.Int()
+
+    class Meta:
+        description = "Queues a large customer import on Celery; poll customerImportJob for progress"
+
+    job_id = graphene.ID()
+    total = graphene.Int()
+
+    @classmethod
+    def mutate(cls, root, info, input, chunk_size=None):
+        from .tasks import import_customers_task
+
+        rows = [{'name': row.name, 'email': row.email, 'phone': row.phone} for row in input]
+        job = import_customers_task.delay(rows, chunk_size)
+        return StartCustomerImport(job_id=job.id, total=len(rows))
+
+class CustomerImportJobType(graphene.ObjectType):
+    job_id = graphene.ID()
+    state = graphene.String()
+    total = graphene.Int()
+    processed = graphene.Int()
+    created = graphene.Int()
+    errors = graphene.List(graphene.String)
 
 class CreateProduct(graphene.Mutation):
     class Arguments:
@@ -123,98 +277,282 @@ class CreateOrder(graphene.Mutation):
         customer_id = graphene.ID(required=True)
         product_ids = graphene.List(graphene.ID, required=True)
         order_date = graphene.DateTime()
+        idempotency_key = graphene.String(description=IDEMPOTENCY_KEY_DESCRIPTION)
 
     order = graphene.Field(OrderType)
     message = graphene.String()
 
-    def mutate(self, info, customer_id, product_ids, order_date=None):
+    def mutate(self, info, customer_id, product_ids, order_date=None, idempotency_key=None):
+        try:
+            return idempotent(
+                f'createOrder:{viewer_scope(info)}', idempotency_key, [customer_id, product_ids, order_date],
+                lambda: CreateOrder.create(customer_id, product_ids, order_date),
+            )
+        except IdempotencyConflict as e:
+            return CreateOrder(message=str(e))
+
+    @staticmethod
+    def create(customer_id, product_ids, order_date):
         try:
             customer = Customer.objects.get(pk=customer_id)
-        except ObjectDoesNotExist:
+        except (ObjectDoesNotExist, ValueError):
             return CreateOrder(message="Invalid customer ID.")
         if not product_ids:
             return CreateOrder(message="At least one product must be selected.")
-        products = []
-        total = Decimal('0.00')
-        for pid in product_ids:
-            try:
-                product = Product.objects.get(pk=pid)
-                products.append(product)
-                total += product.price
-            except ObjectDoesNotExist:
-                return CreateOrder(message=f"Invalid product ID: {pid}")
-        order = Order(customer=customer, total_amount=total, order_date=order_date or datetime.now())
-        order.save()
-        order.products.set(products)
+        # One query for all products; a repeated ID is one more unit of it
+        lines, invalid = order_lines(product_ids, fetch_products(product_ids))
+        if invalid:
+            return CreateOrder(message=invalid_ids_message(invalid))
+        try:
+            order = with_retries(place_order, customer, lines, order_date)
+        except InsufficientStock as e:
+            return CreateOrder(message=str(e))
         return CreateOrder(order=order, message="Order created successfully.")
+
+class OrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    product_ids = graphene.List(graphene.ID, required=True)
+    order_date = graphene.DateTime()
+
+class BatchCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(OrderInput, required=True)
+        idempotency_key = graphene.String(description=IDEMPOTENCY_KEY_DESCRIPTION)
+
+    class Meta:
+        description = "Creates many orders in one transaction with bulk inserts"
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    @classmethod
+    def mutate(cls, root, info, input, idempotency_key=None):
+        def create():
+            orders, errors = create_orders(
+                [(data.customer_id, data.product_ids, data.order_date) for data in input]
+            )
+            return BatchCreateOrders(orders=orders, errors=errors)
+
+        try:
+            return idempotent(f'batchCreateOrders:{viewer_scope(info)}', idempotency_key, input, create)
+        except IdempotencyConflict as e:
+            return BatchCreateOrders(orders=[], errors=[str(e)])
     
 # Update Low Stock Products Mutation()==> REVERT
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        # No arguments needed for this mutation
-        pass
+        threshold = graphene.Int(default_value=10, description="Restock products with stock below this")
+        increment = graphene.Int(default_value=10, description="Units added to each product")
+        chunk_size = graphene.Int(description="Products updated per UPDATE statement and transaction")
+        dry_run = graphene.Boolean(default_value=False, description="Only report what would be updated")
 
     class Meta:
-        description = "Updates all products with stock < 10 by incrementing their stock by 10"
+        description = "Updates all products with stock < threshold (default 10) by incrementing their stock by increment (default 10)"
 
     # Return fields
     success = graphene.Boolean()
     message = graphene.String()
-    updated_products = graphene.List(ProductType)
+    dry_run = graphene.Boolean()
+    updated_products = graphene.List(
+        ProductType,
+        first=graphene.Int(default_value=100),
+        offset=graphene.Int(default_value=0),
+        description="One page of the affected products, in primary key order",
+    )
     updated_count = graphene.Int()
 
+    def resolve_updated_products(self, info, first=100, offset=0):
+        page = (getattr(self, 'updated_ids', None) or [])[offset:offset + first]
+        if not page:
+            return []
+        def load():
+            return list(Product.objects.filter(pk__in=page).order_by('pk'))
+
+        if in_event_loop():
+            return sync_to_async(load)()
+        return load()
+
     @classmethod
-    def mutate(cls, root, info):
+    def mutate(cls, root, info, threshold=10, increment=10, chunk_size=None, dry_run=False):
+        if increment <= 0:
+            return UpdateLowStockProducts(success=False, message="Increment must be positive.", updated_count=0)
+        if chunk_size is not None and chunk_size <= 0:
+            return UpdateLowStockProducts(success=False, message="Chunk size must be positive.", updated_count=0)
         try:
-            with transaction.atomic():
-                # Query products with stock < 10
-                low_stock_products = Product.objects.filter(stock__lt=10)
-                
-                if not low_stock_products.exists():
-                    return UpdateLowStockProducts(
-                        success=True,
-                        message="No low-stock products found",
-                        updated_products=[],
-                        updated_count=0
-                    )
-                
-                # Store products for return and update them
-                updated_products = []
-                
-                for product in low_stock_products:
-                    product.stock += 10
-                    product.save()
-                    updated_products.append(product)
-                
-                return UpdateLowStockProducts(
-                    success=True,
-                    message=f"Successfully updated {len(updated_products)} low-stock products",
-                    updated_products=updated_products,
-                    updated_count=len(updated_products)
-                )
-                
+            updated_count, updated_ids = restock_low_stock(threshold, increment, chunk_size, dry_run)
         except Exception as e:
             return UpdateLowStockProducts(
                 success=False,
                 message=f"Error updating products: {str(e)}",
-                updated_products=[],
                 updated_count=0
             )
 
+        if not updated_count:
+            message = "No low-stock products found"
+        elif dry_run:
+            message = f"Dry run: {updated_count} low-stock products would be updated"
+        else:
+            message = f"Successfully updated {updated_count} low-stock products"
+        result = UpdateLowStockProducts(
+            success=True,
+            message=message,
+            dry_run=dry_run,
+            updated_count=updated_count
+        )
+        result.updated_ids = updated_ids
+        return result
+
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
+    start_customer_import = StartCustomerImport.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    batch_create_orders = BatchCreateOrders.Field()
     # Update low stock products mutation ()==>REVERT
     update_low_stock_products = UpdateLowStockProducts.Field() 
 
 class Query(graphene.ObjectType):
     hello = graphene.String(default_value="Hello, GraphQL!")
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter, order_by=graphene.List(of_type=graphene.String))
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter, order_by=graphene.List(of_type=graphene.String))
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter, order_by=graphene.List(of_type=graphene.String))
+    all_customers = CRMFilterConnectionField(CustomerType, filterset_class=CustomerFilter, order_by=graphene.List(of_type=graphene.String), keyset=('created_at', 'id'))
+    all_products = CRMFilterConnectionField(ProductType, filterset_class=ProductFilter, order_by=graphene.List(of_type=graphene.String))
+    all_orders = CRMFilterConnectionField(OrderType, filterset_class=OrderFilter, order_by=graphene.List(of_type=graphene.String), keyset=('order_date', 'id'))
+    search = graphene.List(
+        SearchHitType,
+        query=graphene.String(required=True),
+        first=graphene.Int(default_value=10),
+        description="Customers and products matching query, best match first",
+    )
+    changes = graphene.Field(
+        ChangesPageType,
+        since=graphene.String(description="endCursor of the previous page; omit to start from the beginning"),
+        first=graphene.Int(default_value=100),
+        description="Resumable feed of customer, product and order changes and deletes, oldest first",
+    )
+    crm_stats = graphene.Field(CRMStatsType, since=graphene.DateTime(), until=graphene.DateTime())
+    sales_by_day = graphene.List(
+        DailySalesType,
+        from_=graphene.Date(required=True, name='from'),
+        to=graphene.Date(required=True),
+        description="Daily sales totals read from the rollup table",
+    )
+    top_products = graphene.List(
+        ProductSalesType,
+        first=graphene.Int(default_value=10),
+        since=graphene.DateTime(),
+        until=graphene.DateTime(),
+    )
+    top_customers = graphene.List(
+        CustomerSpendType,
+        first=graphene.Int(default_value=10),
+        since=graphene.DateTime(),
+        until=graphene.DateTime(),
+    )
+    customer_import_job = graphene.Field(CustomerImportJobType, job_id=graphene.ID(required=True))
     # customer = relay.Node.Field(CustomerType)
     # product = relay.Node.Field(ProductType)
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+    def resolve_search(self, info, query, first=10):
+        first = max(1, min(first, search.MAX_RESULTS))
+        hits = search.search(query.strip(), first)
+        objects = {}
+        for model in {model for model, _, _ in hits}:
+            objects[model] = model.objects.in_bulk([pk for hit_model, pk, _ in hits if hit_model is model])
+        return [
+            SearchHitType(score=score, node=objects[model][pk])
+            for model, pk, score in hits
+            if pk in objects[model]
+        ]
+
+    def resolve_changes(self, info, since=None, first=100):
+        page, has_more = changes.changes(since, first)
+        loaders = get_loaders(info)
+        loaders.prime(Customer, [change.obj for change in page if isinstance(change.obj, Customer)])
+        loaders.prime(Order, [change.obj for change in page if isinstance(change.obj, Order)])
+        end_cursor = page[-1].cursor if page else since
+        return ChangesPageType(changes=page, end_cursor=end_cursor, has_more=has_more)
+
+    def resolve_crm_stats(self, info, since=None, until=None):
+        return CRMStatsType(**reports.crm_stats(since, until))
+
+    def resolve_sales_by_day(self, info, from_, to):
+        rollups = list(DailySalesRollup.objects.filter(day__gte=from_, day__lte=to).order_by('day'))
+        product_sales = {}
+        if 'products' in selected_fields(info, info.field_nodes):
+            for row in DailyProductSales.objects.filter(day__gte=from_, day__lte=to).select_related('product').order_by('day', '-revenue'):
+                product_sales.setdefault(row.day, []).append(row)
+        days = []
+        for rollup in rollups:
+            day = DailySalesType(
+                day=rollup.day,
+                orders=rollup.orders,
+                revenue=rollup.revenue,
+                customers=rollup.customers,
+                units=rollup.units,
+            )
+            day.product_sales = product_sales.get(rollup.day, [])
+            days.append(day)
+        return days
+
+    def resolve_top_products(self, info, first=10, since=None, until=None):
+        rows = reports.top_products(first, since, until)
+        products = Product.objects.in_bulk([row['product_id'] for row in rows])
+        return [
+            ProductSalesType(
+                product=products.get(row['product_id']),
+                units=row['units'],
+                orders=row['orders'],
+                revenue=row['revenue'],
+            )
+            for row in rows
+        ]
+
+    def resolve_top_customers(self, info, first=10, since=None, until=None):
+        rows = reports.top_customers(first, since, until)
+        get_loaders(info).order_customer.prime(row['customer_id'] for row in rows)
+        spend = []
+        for row in rows:
+            entry = CustomerSpendType(orders=row['orders'], spent=row['spent'])
+            entry.customer_id = row['customer_id']
+            spend.append(entry)
+        return spend
+
+    def resolve_customer_import_job(self, info, job_id):
+        from .tasks import import_customers_task
+
+        job = import_customers_task.AsyncResult(job_id)
+        meta = job.info if isinstance(job.info, dict) else {}
+        errors = meta.get('errors', [])
+        if job.failed():
+            errors = [*errors, str(job.info)]
+        return CustomerImportJobType(
+            job_id=job_id,
+            state=job.state,
+            total=meta.get('total'),
+            processed=meta.get('processed', 0),
+            created=meta.get('created', 0),
+            errors=errors,
+        )
+
+class CRMSchema(graphene.Schema):
+    """
+    Schema that always executes with a context object, so the per-request
+    loaders also work for direct ``schema.execute`` calls (e.g. Celery tasks),
+    and with the cost-limiting execution context.
+    """
+    execution_context_class = CostExecutionContext
+
+    def execute(self, *args, **kwargs):
+        return super().execute(*args, **self._execute_kwargs(kwargs))
+
+    async def execute_async(self, *args, **kwargs):
+        return await super().execute_async(*args, **self._execute_kwargs(kwargs))
+
+    def _execute_kwargs(self, kwargs):
+        if kwargs.get('context_value', kwargs.get('context')) is None:
+            kwargs.pop('context', None)
+            kwargs['context_value'] = new_context()
+        kwargs.setdefault('execution_context_class', self.execution_context_class)
+        return kwargs
+
+schema = CRMSchema(query=Query, mutation=Mutation)
\ No newline at end of file
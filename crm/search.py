@@ -0,0 +1,227 @@
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.models import FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import Customer, Product
+
+# Text columns indexed for each searchable model
+SEARCH_FIELDS = {
+    Customer: ('name', 'email'),
+    Product: ('name',),
+}
+
+# Trigram indexes can't answer shorter queries
+MIN_QUERY_LENGTH = 3
+
+# Most hits a search returns (and loads per model)
+MAX_RESULTS = 100
+
+# Rows per INSERT into an FTS table, well under SQLite's bound parameter limit
+INDEX_BATCH_SIZE = 500
+
+
+def search_table(model):
+    return f'crm_search_{model._meta.model_name}'
+
+
+class LikeBackend:
+    """
+    Fallback without an index: ``icontains`` filters, every hit scored 1.
+    """
+
+    name = 'like'
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def index(self, model, objects):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def rebuild(self, model):
+        pass
+
+    def matches(self, model, field, value):
+        """
+        Subquery of the primary keys of ``model`` rows whose ``field``
+        contains ``value`` (case-insensitively), for use with ``__in``.
+        """
+        return model._default_manager.filter(**{f'{field}__icontains': value}).values('pk')
+
+    def search(self, model, query, limit):
+        """
+        Return up to ``limit`` (pk, score) pairs, best match first.
+        """
+        condition = Q()
+        for field in SEARCH_FIELDS[model]:
+            condition |= Q(**{f'{field}__icontains': query})
+        pks = model._default_manager.filter(condition).order_by('pk').values_list('pk', flat=True)[:limit]
+        return [(pk, 1.0) for pk in pks]
+
+
+class SQLiteFTSBackend(LikeBackend):
+    """
+    SQLite FTS5 shadow tables using the trigram tokenizer, one per model
+    (``crm_search_<model>``, rowid = primary key), kept in sync by signals.
+    Substring filters become index-assisted MATCH queries, and search is
+    ranked by bm25.
+    """
+
+    name = 'sqlite_fts'
+
+    def _execute(self, sql, params=()):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def index(self, model, objects):
+        fields = SEARCH_FIELDS[model]
+        rows = [(obj.pk, *(getattr(obj, field) or '' for field in fields)) for obj in objects]
+        if not rows:
+            return
+        row_sql = '(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'
+        # One multi-row INSERT per batch with flat params, rather than
+        # executemany, which debug cursor wrappers can't format
+        for start in range(0, len(rows), INDEX_BATCH_SIZE):
+            batch = rows[start:start + INDEX_BATCH_SIZE]
+            self._execute(
+                f"INSERT OR REPLACE INTO {search_table(model)} (rowid, {', '.join(fields)}) "
+                f"VALUES {', '.join([row_sql] * len(batch))}",
+                [value for row in batch for value in row],
+            )
+
+    def remove(self, model, pks):
+        pks = list(pks)
+        if pks:
+            self._execute(
+                f"DELETE FROM {search_table(model)} WHERE rowid IN ({', '.join(['%s'] * len(pks))})", pks
+            )
+
+    def rebuild(self, model):
+        fields = ', '.join(SEARCH_FIELDS[model])
+        self._execute(f"DELETE FROM {search_table(model)}")
+        self._execute(
+            f"INSERT INTO {search_table(model)} (rowid, {fields}) "
+            f"SELECT id, {fields} FROM {model._meta.db_table}"
+        )
+
+    @staticmethod
+    def phrase(value, field=None):
+        phrase = '"' + value.replace('"', '""') + '"'
+        return f'{field} : {phrase}' if field else phrase
+
+    def matches(self, model, field, value):
+        if len(value) < MIN_QUERY_LENGTH:
+            return super().matches(model, field, value)
+        return RawSQL(
+            f"SELECT rowid FROM {search_table(model)} WHERE {search_table(model)} MATCH %s",
+            (self.phrase(value, field),),
+        )
+
+    def search(self, model, query, limit):
+        if len(query) < MIN_QUERY_LENGTH:
+            return super().search(model, query, limit)
+        table = search_table(model)
+        rows = self._execute(
+            f"SELECT rowid, bm25({table}) FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s",
+            (self.phrase(query), limit),
+        )
+        # bm25 is lower for better matches
+        return [(pk, -score) for pk, score in rows]
+
+
+class Similarity(Func):
+    function = 'similarity'
+    output_field = FloatField()
+
+
+class TrigramBackend(LikeBackend):
+    """
+    PostgreSQL pg_trgm: ``icontains`` compiles to ``UPPER(col::text) LIKE
+    UPPER(%s)``, so the GIN ``gin_trgm_ops`` indexes are built on that
+    expression (migration 0011) and serve the existing filters directly.
+    Search is ranked by similarity().
+    """
+
+    name = 'trigram'
+
+    def search(self, model, query, limit):
+        if len(query) < MIN_QUERY_LENGTH:
+            return super().search(model, query, limit)
+        scores = [Similarity(field, Value(query)) for field in SEARCH_FIELDS[model]]
+        score = scores[0] if len(scores) == 1 else Greatest(*scores)
+        condition = Q()
+        for field in SEARCH_FIELDS[model]:
+            condition |= Q(**{f'{field}__icontains': query})
+        rows = (
+            model._default_manager.filter(condition)
+            .annotate(score=score)
+            .order_by('-score', 'pk')
+            .values_list('pk', 'score')[:limit]
+        )
+        return list(rows)
+
+
+BACKENDS = {backend.name: backend for backend in (LikeBackend, SQLiteFTSBackend, TrigramBackend)}
+
+_backends = {}
+
+
+def _fts_tables_exist(connection):
+    try:
+        tables = connection.introspection.table_names()
+    except OperationalError:
+        return False
+    return all(search_table(model) in tables for model in SEARCH_FIELDS)
+
+
+def get_backend(using='default'):
+    """
+    The search backend for database ``using``: ``CRM_SEARCH_BACKEND`` if set,
+    otherwise the best one the database supports.
+    """
+    backend = _backends.get(using)
+    if backend is None:
+        name = getattr(settings, 'CRM_SEARCH_BACKEND', None)
+        if name is None:
+            connection = connections[using]
+            if connection.vendor == 'sqlite' and _fts_tables_exist(connection):
+                name = SQLiteFTSBackend.name
+            elif connection.vendor == 'postgresql':
+                name = TrigramBackend.name
+            else:
+                name = LikeBackend.name
+        backend = _backends[using] = BACKENDS[name](using)
+    return backend
+
+
+def index(model, objects):
+    if model in SEARCH_FIELDS:
+        get_backend().index(model, objects)
+
+
+def remove(model, pks):
+    if model in SEARCH_FIELDS:
+        get_backend().remove(model, pks)
+
+
+def matches(model, field, value):
+    return get_backend().matches(model, field, value)
+
+
+def search(query, limit=10, models=None):
+    """
+    Rank rows of every searchable model (or just ``models``) against
+    ``query``. Returns up to ``limit`` (model, pk, score) triples, best
+    first.
+    """
+    backend = get_backend()
+    hits = []
+    for model in models or SEARCH_FIELDS:
+        hits.extend((model, pk, score) for pk, score in backend.search(model, query, limit))
+    hits.sort(key=lambda hit: -hit[2])
+    return hits[:limit]
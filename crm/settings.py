@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 import environ
+from celery.schedules import crontab
 
 
 
@@ -145,6 +146,9 @@ GRAPHENE = {
     'SCHEMA': 'graphql_crm.schema.schema'
 }
 
+# CRM app settings (counts, caches, query limits, jobs)
+from graphql_crm.crm_settings import *
+
 
 # CRONJOBS configuration
 CRONJOBS = [
@@ -163,6 +167,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'crm.tasks.generate_crm_report',
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),  # Every Monday at 6:00 AM
     },
+    'update-sales-rollup': {
+        'task': 'crm.tasks.update_sales_rollup',
+        'schedule': crontab(minute='*/10'),  # Every 10 minutes
+    },
+    'rebuild-counts': {
+        'task': 'crm.tasks.rebuild_counts',
+        'schedule': crontab(hour=3, minute=30),  # Every day at 3:30 AM
+    },
 }
 
 # Celery Time Zone
@@ -180,6 +192,11 @@ CELERY_RESULT_EXPIRES = 3600  # 1 hour
 CELERY_TASK_ROUTES = {
     'crm.tasks.generate_crm_report': {'queue': 'reports'},
     'crm.tasks.test_celery_task': {'queue': 'default'},
+    'crm.tasks.import_customers_task': {'queue': 'default'},
+    'crm.tasks.update_sales_rollup': {'queue': 'reports'},
+    'crm.tasks.report_shard': {'queue': 'reports'},
+    'crm.tasks.reduce_crm_report': {'queue': 'reports'},
+    'crm.tasks.rebuild_counts': {'queue': 'reports'},
 }
 
 # Optional: Worker configuration
@@ -0,0 +1,68 @@
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counts, idempotency, response_cache, search
+from .models import Customer, Order, OrderLine, Product, Tombstone
+from .phones import normalize_phone
+
+COUNTED_MODELS = (Customer, Product, Order)
+
+# Models whose deletes are reported by the change feed
+TOMBSTONED_MODELS = (Customer, Product, Order)
+
+
+@receiver(pre_save, sender=Customer)
+def normalize_customer_phone(sender, instance, **kwargs):
+    instance.phone_normalized = normalize_phone(instance.phone)
+
+
+@receiver(post_save)
+def count_created(sender, instance, created, **kwargs):
+    if created and sender in COUNTED_MODELS:
+        counts.adjust(sender, 1)
+
+
+@receiver(post_delete)
+def count_deleted(sender, instance, **kwargs):
+    if sender in COUNTED_MODELS:
+        counts.adjust(sender, -1)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_responses(sender, **kwargs):
+    response_cache.invalidate_models(sender)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products(sender, action, **kwargs):
+    if action.startswith('post_'):
+        response_cache.invalidate_models(Order)
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def invalidate_order_lines(sender, **kwargs):
+    response_cache.invalidate_models(Order)
+
+
+@receiver(post_save)
+def index_for_search(sender, instance, **kwargs):
+    search.index(sender, [instance])
+
+
+@receiver(post_delete)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(sender, [instance.pk])
+
+
+@receiver(post_delete)
+def record_tombstone(sender, instance, **kwargs):
+    if sender in TOMBSTONED_MODELS:
+        Tombstone.objects.create(model=sender._meta.label, object_id=instance.pk)
+
+
+@receiver(request_finished)
+def release_uncommitted_idempotency_keys(sender, **kwargs):
+    idempotency.forget_uncommitted()
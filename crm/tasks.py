@@ -1,70 +1,122 @@
 # crm/tasks.py
-from celery import shared_task
+from celery import chord, shared_task
 from datetime import datetime
-from .schema import schema
+import time
+from django.db import DatabaseError
+from . import counts
+from .bulk import import_customers
+from .idempotency import acquire, release, single_instance
+from .joblog import get_log
+from .reports import merge_shard_stats, order_shards, shard_stats
+from .rollup import update_rollup
+from .signals import COUNTED_MODELS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Held from dispatching a report until its reducer has run
+REPORT_LOCK = 'crm.tasks.generate_crm_report'
+
+def _log_report_error(error_msg):
+    logger.error(error_msg)
+    
+    # Record the failure in the crm_report job log
+    try:
+        with get_log('crm_report') as log:
+            log.record(status='error', error=error_msg)
+    except Exception as log_error:
+        logger.error(f"Failed to write error to job log: {log_error}")
+
 @shared_task(bind=True)
-def generate_crm_report(self):
+def generate_crm_report(self, shard_size=None):
     """
-    Generate a weekly CRM report using GraphQL queries.
-    Summarizes total customers, orders, and revenue.
+    Generate a weekly CRM report of total customers, orders, and revenue.
+
+    The orders are split into id ranges of ``shard_size`` (default
+    ``CRM_REPORT_SHARD_SIZE``) and dispatched as a chord: one
+    ``report_shard`` task per range computes partial aggregates on any
+    worker, and ``reduce_crm_report`` merges them and writes the report.
+
+    Only one report runs at a time: a redelivered or overlapping call is
+    skipped while the lock is held. The reducer releases it; if a shard
+    fails for good it expires after ``CRM_TASK_LOCK_TTL``.
     """
+    token = acquire(REPORT_LOCK)
+    if token is None:
+        logger.info("CRM Report skipped: another report is still running")
+        with get_log('crm_report') as log:
+            log.record(status='skipped', reason='duplicate')
+        return {'status': 'skipped', 'reason': 'duplicate'}
     try:
-        # GraphQL query to fetch CRM statistics
-        query = """
-        query {
-            allCustomers {
-                totalCount
-            }
-            allOrders {
-                totalCount
-                edges {
-                    node {
-                        totalAmount
-                    }
-                }
-            }
-        }
-        """
+        shards = order_shards(shard_size)
+        result = chord(report_shard.s(low, high) for low, high in shards)(reduce_crm_report.s(lock=token))
+        logger.info(f"CRM Report dispatched as {len(shards)} shards")
+        return {'status': 'dispatched', 'shards': len(shards), 'chord_id': result.id}
         
-        # Execute the GraphQL query
-        result = schema.execute(query)
-        
-        if result.errors:
-            error_msg = f"GraphQL query errors: {result.errors}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        
-        # Extract data from the result
-        data = result.data
-        
-        # Get customer count
-        customer_count = data.get('allCustomers', {}).get('totalCount', 0)
+    except Exception as e:
+        release(REPORT_LOCK, token)
+        _log_report_error(f"Error generating CRM report: {str(e)}")
         
-        # Get order count and calculate total revenue
-        orders_data = data.get('allOrders', {})
-        order_count = orders_data.get('totalCount', 0)
+        # Re-raise the exception for Celery to handle
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+@shared_task(bind=True)
+def report_shard(self, low, high):
+    """
+    Partial CRM report aggregates of the orders with ids in [low, high),
+    with the time taken. A failing shard is retried on its own; the other
+    shards' results are kept by the chord.
+    """
+    start = time.perf_counter()
+    try:
+        stats = shard_stats(low, high)
+    except DatabaseError as e:
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+    return {
+        'low': low,
+        'high': high,
+        'orders': stats['orders'],
+        # Kept exact through the JSON serializer
+        'revenue': str(stats['revenue']),
+        'units': stats['units'],
+        'seconds': round(time.perf_counter() - start, 3),
+        'worker': self.request.hostname,
+    }
+
+@shared_task
+def reduce_crm_report(partials, lock=None):
+    """
+    Merge the ``report_shard`` results into the CRM report and log it,
+    along with per-shard timings, then release the report lock.
+    """
+    try:
+        stats = merge_shard_stats(partials)
+        customer_count = stats['customers']
+        order_count = stats['orders']
+        total_revenue = stats['revenue']
         
-        # Calculate total revenue
-        total_revenue = 0.0
-        orders_edges = orders_data.get('edges', [])
-        for edge in orders_edges:
-            order = edge.get('node', {})
-            total_amount = order.get('totalAmount', 0)
-            if total_amount:
-                total_revenue += float(total_amount)
+        for partial in partials:
+            logger.info(
+                f"CRM Report shard [{partial['low']}, {partial['high']}): {partial['orders']} orders "
+                f"in {partial['seconds']:.3f}s on {partial['worker']}"
+            )
+        slowest = max((partial['seconds'] for partial in partials), default=0)
         
         # Format the report
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         report_message = f"{timestamp} - Report: {customer_count} customers, {order_count} orders, ${total_revenue:.2f} revenue."
         
-        # Log to file
-        log_file = "/tmp/crm_report_log.txt"
-        with open(log_file, 'a') as f:
-            f.write(report_message + "\n")
+        # Record in the crm_report job log
+        with get_log('crm_report') as log:
+            log.record(
+                status='success',
+                message=report_message,
+                customers=customer_count,
+                orders=order_count,
+                revenue=total_revenue,
+                shards=len(partials),
+                slowest_shard_seconds=slowest,
+            )
         
         # Also log to Django logger
         logger.info(f"CRM Report generated: {customer_count} customers, {order_count} orders, ${total_revenue:.2f} revenue")
@@ -74,25 +126,68 @@ def generate_crm_report(self):
             'customers': customer_count,
             'orders': order_count,
             'revenue': total_revenue,
-            'message': report_message
+            'message': report_message,
+            'shards': [
+                {key: partial[key] for key in ('low', 'high', 'orders', 'seconds', 'worker')}
+                for partial in partials
+            ],
         }
         
     except Exception as e:
-        error_msg = f"Error generating CRM report: {str(e)}"
-        logger.error(error_msg)
-        
-        # Log error to file
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        error_log = f"{timestamp} - ERROR: {error_msg}"
-        
-        try:
-            with open("/tmp/crm_report_log.txt", 'a') as f:
-                f.write(error_log + "\n")
-        except Exception as log_error:
-            logger.error(f"Failed to write error to log file: {log_error}")
-        
-        # Re-raise the exception for Celery to handle
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+        _log_report_error(f"Error generating CRM report: {str(e)}")
+        raise
+    
+    finally:
+        if lock is not None:
+            release(REPORT_LOCK, lock)
+
+@shared_task(bind=True)
+@single_instance()
+def import_customers_task(self, rows, chunk_size=None):
+    """
+    Import a large list of customer rows chunk by chunk, publishing
+    progress (processed/created/errors) as the PROGRESS task state.
+    """
+    total = len(rows)
+
+    def progress(processed, created, errors):
+        self.update_state(state='PROGRESS', meta={
+            'total': total,
+            'processed': processed,
+            'created': created,
+            'errors': errors,
+        })
+
+    created, errors = import_customers(rows, chunk_size=chunk_size, progress=progress, collect=False)
+    logger.info(f"Customer import {self.request.id}: {created} created, {len(errors)} rejected")
+    with get_log('customer_import') as log:
+        log.record(status='success', task_id=self.request.id, total=total, created=created, rejected=len(errors))
+    return {'total': total, 'processed': total, 'created': created, 'errors': errors}
+
+@shared_task
+@single_instance()
+def update_sales_rollup():
+    """
+    Fold orders placed since the last run into the daily sales rollup.
+    """
+    days = update_rollup()
+    if days:
+        logger.info(f"Sales rollup updated for {len(days)} days ({days[0]} to {days[-1]})")
+    with get_log('sales_rollup') as log:
+        log.record(status='success', days=[day.isoformat() for day in days])
+    return [day.isoformat() for day in days]
+
+@shared_task
+@single_instance()
+def rebuild_counts():
+    """
+    Reset the stored row counts behind unfiltered totalCount from exact
+    counts, correcting any drift of the signal-maintained counters.
+    """
+    rebuilt = {counts.model_label(model): counts.rebuild(model) for model in COUNTED_MODELS}
+    with get_log('rebuild_counts') as log:
+        log.record(status='success', counts=rebuilt)
+    return rebuilt
 
 @shared_task
 def test_celery_task():
@@ -1,3 +1,467 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene_django.debug import DjangoDebugMiddleware
+
+from graphql_crm.schema import schema
+
+from . import celery_app, counts, idempotency, inventory, joblog, response_cache, search
+from .idempotency import IdempotencyConflict, acquire, dump_payload, idempotent, load_payload, release
+from .models import Customer, ModelCounter, Order, Product
+from .document_cache import query_hash
+from .orders import order_lines
+from .schema import BulkCreateCustomers
+from .tasks import REPORT_LOCK, generate_crm_report, rebuild_counts
+from .views import CRMGraphQLView
+
+
+class SearchIndexTests(TestCase):
+    def execute(self, query, **kwargs):
+        result = schema.execute(query, **kwargs)
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_saves_under_debug_middleware(self):
+        # DEBUG installs DjangoDebugMiddleware, which wraps the cursor that
+        # the post_save receiver indexes through
+        self.execute(
+            'mutation { createCustomer(input: {name: "Ada Lovelace", email: "ada@example.com"}) { customer { id } } }',
+            middleware=[DjangoDebugMiddleware()],
+        )
+        self.execute(
+            'mutation { createProduct(input: {name: "Analytical Engine", price: 10.5, stock: 1}) { product { id } } }',
+            middleware=[DjangoDebugMiddleware()],
+        )
+        # Later saves in the same process still work
+        Product.objects.create(name="Difference Engine", price=5, stock=1)
+
+        hits = {(model, pk) for model, pk, _ in search.search('engine')}
+        self.assertEqual(hits, {(Product, pk) for pk in Product.objects.values_list('pk', flat=True)})
+        self.assertEqual(search.search('lovelace')[0][:2], (Customer, Customer.objects.get().pk))
+
+
+class QueryCostTests(TestCase):
+    def cost(self, query):
+        result = schema.execute(query)
+        return result.extensions['cost']['requested'] if result.extensions else None, result.errors
+
+    def test_plain_list_multiplied_by_its_first_argument(self):
+        # 1 for the list field, plus 1 for each hit's node
+        cost, errors = self.cost('{ search(query: "abc", first: 5) { score node { __typename } } }')
+        self.assertIsNone(errors)
+        self.assertEqual(cost, 1 + 5)
+        cost, _ = self.cost('{ search(query: "abc") { score node { __typename } } }')
+        self.assertEqual(cost, 1 + 10)
+
+    def test_page_object_lists_multiplied_by_first(self):
+        # 1 for the page, plus 1 for each change's node
+        query = '{ changes(first: %d) { changes { node { __typename } } } }'
+        self.assertEqual(self.cost(query % 10), (1 + 1 + 10, None))
+        self.assertEqual(self.cost(query % 1000), (1 + 1 + 1000, None))
+        # The resolver never returns more than its maximum page
+        self.assertEqual(self.cost(query % 100000), (1 + 1 + 1000, None))
+
+    def test_huge_first_on_plain_list_is_rejected(self):
+        _, errors = self.cost('{ search(query: "abc", first: 100000) { score node { __typename } } }')
+        self.assertEqual(errors[0].extensions['code'], 'QUERY_TOO_COMPLEX')
+
+
+class OrderLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = [Product.objects.create(name=f"Product {i}", price=i + 1, stock=5) for i in range(3)]
+        customer = Customer.objects.create(name="Grace Hopper", email="grace@example.com")
+        for i in range(3):
+            order = Order.objects.create(customer=customer, total_amount=1)
+            order.products.set(products[:i + 1], through_defaults={'unit_price': 1})
+
+    def test_prefetched_lines_prime_the_loaders(self):
+        # Orders, plus the prefetched lines (with their products) and products
+        with self.assertNumQueries(3):
+            result = schema.execute(
+                '{ allOrders(first: 3) { edges { node { lines { quantity product { name } } products { name } } } } }'
+            )
+        self.assertIsNone(result.errors)
+        nodes = [edge['node'] for edge in result.data['allOrders']['edges']]
+        self.assertEqual([len(node['lines']) for node in nodes], [1, 2, 3])
+        self.assertEqual(
+            [[line['product'] for line in node['lines']] for node in nodes],
+            [node['products'] for node in nodes],
+        )
+        # Lines alone come straight from the prefetch
+        with self.assertNumQueries(2):
+            schema.execute('{ allOrders(first: 3) { edges { node { lines { product { name } } } } } }')
+
+
+class OrderLinesTests(TestCase):
+    def test_ids_of_the_same_product_are_one_line(self):
+        product = Product.objects.create(name="Widget", price=2, stock=5)
+        pk = product.pk
+        lines, invalid = order_lines([str(pk), f"0{pk}", pk, "x", pk + 1], {pk: product})
+        self.assertEqual(lines, [(product, 3)])
+        self.assertEqual(invalid, ["x", str(pk + 1)])
+
+    def test_create_order_with_padded_id(self):
+        customer = Customer.objects.create(name="Alan Turing", email="alan@example.com")
+        product = Product.objects.create(name="Widget", price=2, stock=5)
+        result = schema.execute(
+            'mutation($c: ID!, $p: [ID]!) { createOrder(customerId: $c, productIds: $p) { order { lines { quantity } } message } }',
+            variable_values={'c': customer.pk, 'p': [str(product.pk), f"0{product.pk}"]},
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['createOrder']['order']['lines'], [{'quantity': 2}])
+
+
+class RestockTests(TestCase):
+    def test_rows_restocked_concurrently_are_not_reported(self):
+        low, restocked = (Product.objects.create(name=f"Low {i}", price=1, stock=1) for i in range(2))
+        atomic = transaction.atomic
+
+        def restock_elsewhere(*args, **kwargs):
+            # Another worker tops up a row after the chunk was listed
+            Product.objects.filter(pk=restocked.pk).update(stock=50)
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(inventory.transaction, 'atomic', restock_elsewhere):
+            count, ids = inventory.restock_low_stock(threshold=10, increment=10)
+        self.assertEqual((count, ids), (1, [low.pk]))
+        self.assertEqual(Product.objects.get(pk=restocked.pk).stock, 50)
+
+    async def test_updated_products_over_the_async_view(self):
+        product = await Product.objects.acreate(name="Low", price=1, stock=1)
+        response = await self.async_client.post(
+            '/graphql/async',
+            {'query': 'mutation { updateLowStockProducts { updatedCount updatedProducts { name stock } } }'},
+            content_type='application/json',
+        )
+        data = json.loads(response.content)
+        self.assertNotIn('errors', data)
+        self.assertEqual(
+            data['data']['updateLowStockProducts'],
+            {'updatedCount': 1, 'updatedProducts': [{'name': product.name, 'stock': 11}]},
+        )
+
+
+class OffsetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create(Product(name=f"Product {i}", price=1, stock=1) for i in range(5))
+
+    def page(self, arguments):
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(
+                f'{{ allProducts({arguments}) {{ pageInfo {{ hasNextPage }} edges {{ node {{ name }} }} }} }}'
+            )
+        self.assertIsNone(result.errors)
+        # Counting stops at the end of the page
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(*) AS' in q['sql']])
+        page = result.data['allProducts']
+        return [edge['node']['name'] for edge in page['edges']], page['pageInfo']['hasNextPage']
+
+    def test_pages_without_counting_the_table(self):
+        self.assertEqual(self.page('first: 2'), (["Product 0", "Product 1"], True))
+        self.assertEqual(self.page('first: 2, offset: 2'), (["Product 2", "Product 3"], True))
+        self.assertEqual(self.page('first: 2, offset: 4'), (["Product 4"], False))
+        self.assertEqual(self.page('first: 2, offset: 40'), ([], False))
+
+    def page_from_end(self, arguments):
+        result = schema.execute(
+            f'{{ allProducts({arguments}) {{ pageInfo {{ hasPreviousPage }} edges {{ cursor node {{ name }} }} }} }}'
+        )
+        self.assertIsNone(result.errors)
+        page = result.data['allProducts']
+        return [edge['node']['name'] for edge in page['edges']], page['pageInfo']['hasPreviousPage']
+
+    @override_settings(CRM_COUNT_CAP=3)
+    def test_last_page_past_the_count_cap(self):
+        self.assertEqual(self.page_from_end('last: 2'), (["Product 3", "Product 4"], True))
+        self.assertEqual(self.page_from_end('last: 2, stock_Gte: 0'), (["Product 3", "Product 4"], True))
+        before = schema.execute('{ allProducts(first: 4) { edges { cursor } } }').data['allProducts']['edges'][3]['cursor']
+        self.assertEqual(
+            self.page_from_end(f'last: 2, before: "{before}", stock_Gte: 0'), (["Product 1", "Product 2"], True)
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTests(TestCase):
+    view = staticmethod(CRMGraphQLView.as_view(schema=schema, response_cache_ttl=60))
+    query = '{ allProducts(first: 10) { edges { node { name stock } } } }'
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Widget", price=1, stock=1)
+
+    def request(self, query=None, user=None):
+        request = RequestFactory().post(
+            '/graphql', {'query': query or self.query}, content_type='application/json'
+        )
+        request.user = user or AnonymousUser()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.view(request)
+        return json.loads(response.content)['data'], len(queries)
+
+    def stocks(self, data):
+        return [edge['node']['stock'] for edge in data['allProducts']['edges']]
+
+    def test_store_and_lookup(self):
+        versions = response_cache.tag_versions()
+        response_cache.store('key', {'answer': 42}, {'Product'}, versions, 60)
+        self.assertEqual(response_cache.lookup('key'), {'answer': 42})
+        with self.captureOnCommitCallbacks(execute=True):
+            response_cache.invalidate('Customer')
+        self.assertEqual(response_cache.lookup('key'), {'answer': 42})
+        with self.captureOnCommitCallbacks(execute=True):
+            response_cache.invalidate('Product')
+        self.assertIsNone(response_cache.lookup('key'))
+
+    def test_repeated_query_is_served_from_cache(self):
+        data, queries = self.request()
+        self.assertTrue(queries)
+        self.assertEqual(self.request(), (data, 0))
+
+    def test_save_invalidates(self):
+        self.request()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.stock = 7
+            self.product.save()
+        self.assertEqual(self.stocks(self.request()[0]), [7])
+
+    def test_writes_without_signals_invalidate(self):
+        tracker = response_cache.TableTracker()
+        with connection.execute_wrapper(tracker):
+            Product.objects.filter(pk=self.product.pk).update(stock=3)
+            Customer.objects.bulk_create([Customer(name="Ada", email="ada@example.com")])
+        self.assertEqual(tracker.written, {'Product', 'Customer'})
+
+        # Through the view: a mutation restocking with queryset.update(),
+        # leaving the invalidation to the view's tracker
+        self.request()
+        with mock.patch.object(response_cache, 'invalidate_models'):
+            self.request('mutation { updateLowStockProducts(threshold: 5) { updatedCount } }')
+        self.assertEqual(self.stocks(self.request()[0]), [13])
+
+    def test_responses_are_kept_per_viewer(self):
+        alice = User.objects.create(username="alice")
+        bob = User.objects.create(username="bob")
+        self.request(user=alice)
+        self.assertEqual(self.request(user=alice)[1], 0)
+        self.assertGreater(self.request(user=bob)[1], 0)
+        self.assertGreater(self.request()[1], 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReportTaskTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Run the chord in-process, CELERY_TASK_ALWAYS_EAGER style
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', eager)
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        settings = self.settings(CRM_JOB_LOG_DIR=log_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        logs = mock.patch.dict(joblog._logs, clear=True)
+        logs.start()
+        self.addCleanup(logs.stop)
+
+    def report(self, **kwargs):
+        return generate_crm_report.apply(kwargs=kwargs).get(), joblog.tail('crm_report', 1)[0]
+
+    def test_shards_add_up(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        product = Product.objects.create(name="Widget", price=1, stock=100)
+        for amount in (10, 20, 30, 40, 50):
+            order = Order.objects.create(customer=customer, total_amount=amount)
+            order.products.set([product], through_defaults={'unit_price': 1, 'quantity': 2})
+        # A gap in the ids leaves the middle shard empty
+        Order.objects.filter(total_amount__in=(30, 40)).delete()
+
+        result, record = self.report(shard_size=2)
+        self.assertEqual((result['status'], result['shards']), ('dispatched', 3))
+        self.assertEqual(record['status'], 'success')
+        self.assertEqual((record['customers'], record['orders'], record['revenue']), (1, 3, '80.00'))
+        self.assertEqual(record['shards'], 3)
+
+    def test_no_orders(self):
+        result, record = self.report()
+        self.assertEqual(result['shards'], 0)
+        self.assertEqual((record['status'], record['orders'], record['revenue']), ('success', 0, '0.00'))
+
+    def test_one_report_at_a_time(self):
+        token = acquire(REPORT_LOCK)
+        result, record = self.report()
+        self.assertEqual(result, {'status': 'skipped', 'reason': 'duplicate'})
+        self.assertEqual(record['status'], 'skipped')
+        release(REPORT_LOCK, token)
+
+        # The reducer releases the lock once the report is written
+        self.assertEqual(self.report()[0]['status'], 'dispatched')
+        self.assertEqual(self.report()[0]['status'], 'dispatched')
+
+
+class CacheStatsTests(TestCase):
+    def test_staff_only(self):
+        response = self.client.get('/graphql/cache-stats')
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        response = self.client.get('/graphql/cache-stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hits', response.json())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PersistedQueryTests(TestCase):
+    def post(self, query=None, sha256=None):
+        body = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': sha256 or query_hash(query)}}}
+        if query is not None:
+            body['query'] = query
+        return self.client.post('/graphql', body, content_type='application/json').json()
+
+    def test_only_valid_documents_are_persisted(self):
+        cache.clear()
+        for junk in ('{ nope }', '{ unclosed'):
+            self.assertIn('errors', self.post(junk))
+            self.assertEqual(
+                self.post(sha256=query_hash(junk))['errors'][0]['extensions']['code'], 'PERSISTED_QUERY_NOT_FOUND'
+            )
+        query = '{ hello }'
+        self.assertEqual(self.post(query)['data'], self.post(sha256=query_hash(query))['data'])
+
+
+class ExportTests(TestCase):
+    def test_staff_only(self):
+        Customer.objects.create(name="Ada", email="ada@example.com")
+        response = self.client.get('/export/customers.csv')
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(User.objects.create(username="user"))
+        self.assertEqual(self.client.get('/export/customers.csv').status_code, 302)
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        response = self.client.get('/export/customers.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'ada@example.com', b''.join(response.streaming_content))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_payload_is_stored_as_plain_data(self):
+        customers = [Customer.objects.create(name=name, email=f"{name}@example.com") for name in ("ada", "alan")]
+        payload = BulkCreateCustomers(customers=customers, errors=["Row 3: Invalid email format."])
+        data = json.loads(json.dumps(dump_payload(payload)))
+
+        customers[0].delete()
+        replayed = load_payload(BulkCreateCustomers, data)
+        self.assertEqual(replayed.customers, customers[1:])
+        self.assertEqual(replayed.errors, payload.errors)
+
+    def test_replay_returns_the_first_result(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        product = Product.objects.create(name="Widget", price=2, stock=5)
+        query = (
+            'mutation { createOrder(customerId: %d, productIds: [%d], idempotencyKey: "once") '
+            '{ order { id totalAmount lines { quantity } } message } }' % (customer.pk, product.pk)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            first = schema.execute(query)
+        self.assertIsNone(first.errors)
+        replay = schema.execute(query)
+        self.assertIsNone(replay.errors)
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_rolled_back_result_is_not_replayed(self):
+        calls = []
+
+        def create():
+            calls.append(Customer.objects.create(name="Ada", email="ada@example.com"))
+            return BulkCreateCustomers(customers=calls[-1:], errors=[])
+
+        try:
+            with transaction.atomic():
+                idempotent('test', 'once', [], create)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # Still held until the request that rolled back finishes
+        with self.assertRaises(IdempotencyConflict):
+            idempotent('test', 'once', [], create)
+        idempotency.forget_uncommitted()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            idempotent('test', 'once', [], create)
+        replay = idempotent('test', 'once', [], create)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(replay.customers, [Customer.objects.get()])
+
+
+class JobLogTests(TestCase):
+    def test_customer_cleanup_reports_to_the_job_log(self):
+        active = Customer.objects.create(name="Ada", email="ada@example.com")
+        lapsed = Customer.objects.create(name="Alan", email="alan@example.com")
+        Customer.objects.create(name="Grace", email="grace@example.com")
+        Order.objects.create(customer=active, total_amount=1)
+        old = Order.objects.create(customer=lapsed, total_amount=1)
+        Order.objects.filter(pk=old.pk).update(order_date=timezone.now() - timedelta(days=400))
+
+        with tempfile.TemporaryDirectory() as log_dir, self.settings(CRM_JOB_LOG_DIR=log_dir):
+            with mock.patch.dict(joblog._logs, clear=True):
+                call_command('clean_inactive_customers', stdout=io.StringIO())
+                record = joblog.tail('customer_cleanup', 1)[0]
+        self.assertEqual((record['status'], record['deleted']), ('success', 2))
+        self.assertEqual(list(Customer.objects.all()), [active])
+
+    def test_idle_log_is_flushed_after_the_interval(self):
+        with tempfile.TemporaryDirectory() as log_dir, self.settings(
+            CRM_JOB_LOG_DIR=log_dir, CRM_JOB_LOG_FLUSH_INTERVAL=0.2
+        ):
+            log = joblog.JobLog('timer_test')
+            log.record(status='success')
+            self.assertEqual(joblog.tail('timer_test'), [])
+            log._timer.join(1)
+            self.assertEqual([record['status'] for record in joblog.tail('timer_test')], ['success'])
+            self.assertIsNone(log._timer)
+
+
+class ModelCounterTests(TestCase):
+    def stored(self):
+        return ModelCounter.objects.get(label='crm.Product').count
+
+    def test_deltas_apply_on_commit(self):
+        counts.rebuild(Product)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Widget", price=1, stock=1)
+            # Not while the writer's transaction is open
+            self.assertEqual(self.stored(), 0)
+        self.assertEqual(self.stored(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name="Gadget", price=1, stock=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual((callbacks, self.stored()), ([], 1))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_rebuild_corrects_drift(self):
+        Product.objects.create(name="Widget", price=1, stock=1)
+        ModelCounter.objects.update_or_create(label='crm.Product', defaults={'count': 42})
+        with tempfile.TemporaryDirectory() as log_dir, self.settings(CRM_JOB_LOG_DIR=log_dir):
+            with mock.patch.dict(joblog._logs, clear=True):
+                self.assertEqual(rebuild_counts()['crm.Product'], 1)
+        self.assertEqual(self.stored(), 1)
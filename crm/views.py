@@ -1,3 +1,353 @@
-from django.shortcuts import render
+import json
+from inspect import isawaitable
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+from graphql.error import GraphQLError
+from graphql.execution.middleware import MiddlewareManager
+
+from . import exports, response_cache
+from .document_cache import document_cache, query_hash, schema_version
+from .middleware import SyncRootFieldMiddleware
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that reuses parsed and validated documents across requests
+    and supports Automatic Persisted Queries: clients may send only
+    ``extensions.persistedQuery.sha256Hash`` once the query has been registered.
+
+    Setting ``response_cache_ttl`` opts read operations into the response
+    cache; entries are dropped as soon as a model they read from changes.
+    """
+
+    response_cache_ttl = None
+
+    def __init__(self, response_cache_ttl=None, **kwargs):
+        super().__init__(**kwargs)
+        if response_cache_ttl is not None:
+            self.response_cache_ttl = response_cache_ttl
+
+    def get_viewer(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.pk
+        return None
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            # Unlike GraphQLView, pass extensions (e.g. the query cost) through
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def get_persisted_query(self, request, data, query):
+        """
+        Resolve the APQ extension of the request. Returns (query, sha256):
+        the query text (or an ExecutionResult carrying the APQ error), and
+        the hash to register it under once it has validated, if it is new.
+        """
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = (extensions or {}).get('persistedQuery')
+        if not persisted:
+            return query, None
+
+        sha256 = persisted.get('sha256Hash')
+        if persisted.get('version') != 1 or not sha256:
+            return ExecutionResult(errors=[GraphQLError(
+                "PersistedQueryNotSupported",
+                extensions={'code': 'PERSISTED_QUERY_NOT_SUPPORTED'},
+            )]), None
+        if query:
+            if query_hash(query) != sha256:
+                return ExecutionResult(errors=[GraphQLError(
+                    "provided sha does not match query",
+                    extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'},
+                )]), None
+            return query, sha256
+
+        query = document_cache.get_persisted_query(sha256)
+        if query is None:
+            return ExecutionResult(errors=[GraphQLError(
+                "PersistedQueryNotFound",
+                extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+            )]), None
+        return query, None
+
+    def prepare_document(self, request, data, query, operation_name, show_graphiql=False):
+        """
+        Resolve, parse and validate the request's document.
+
+        Returns (document, operation_ast, None), or (None, None, result) when
+        the request must be answered with ``result`` without executing.
+        """
+        query, persist_as = self.get_persisted_query(request, data, query)
+        if isinstance(query, ExecutionResult):
+            return None, None, query
+
+        if not query:
+            if show_graphiql:
+                return None, None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return None, None, ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = document_cache.get(schema, query, self.validation_rules)
+        except Exception as e:
+            return None, None, ExecutionResult(errors=[e])
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return None, None, ExecutionResult(data=None, errors=validation_errors)
+        # Only documents that parse and validate are registered
+        if persist_as:
+            document_cache.persist_query(persist_as, query)
+        return document, operation_ast, None
+
+    def get_execution_context_class(self):
+        return self.execution_context_class or getattr(self.schema, 'execution_context_class', None)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        document, operation_ast, result = self.prepare_document(
+            request, data, query, operation_name, show_graphiql
+        )
+        if document is None:
+            return result
+        schema = self.schema.graphql_schema
+
+        cache_key = None
+        if self.response_cache_ttl and operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            cache_key = response_cache.cache_key(
+                schema_version(schema), document, operation_name, variables, self.get_viewer(request)
+            )
+            cached = response_cache.lookup(cache_key)
+            if cached is not None:
+                return ExecutionResult(data=cached)
+
+        if not self.response_cache_ttl:
+            return self.execute_document(request, schema, document, operation_ast, variables, operation_name)
+
+        versions = response_cache.tag_versions() if cache_key else None
+        tracker = response_cache.TableTracker()
+        with connection.execute_wrapper(tracker):
+            result = self.execute_document(request, schema, document, operation_ast, variables, operation_name)
+
+        # Writes that bypass model signals (bulk_create, queryset.update)
+        # still invalidate the responses that read those models
+        response_cache.invalidate(*tracker.written)
+        if cache_key and not result.errors:
+            response_cache.store(cache_key, result.data, tracker.read, versions, self.response_cache_ttl)
+        return result
+
+    def execute_document(self, request, schema, document, operation_ast, variables, operation_name):
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            execution_context_class = self.get_execution_context_class()
+            if execution_context_class:
+                execute_options["execution_context_class"] = execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    Async variant of CRMGraphQLView for ASGI deployments.
+
+    A request waiting on the database no longer holds a worker thread: root
+    fields run in Django's database thread (see SyncRootFieldMiddleware) and
+    nested relations are batched through the loaders with the async ORM.
+    GraphiQL and the response cache stay on the sync view.
+    """
+
+    graphiql = False
+
+    async def get(self, request, *args, **kwargs):
+        return await self.handle(request)
+
+    async def post(self, request, *args, **kwargs):
+        return await self.handle(request)
+
+    def dispatch(self, request, *args, **kwargs):
+        # Plain View.dispatch, so the async handlers are awaited by Django
+        return super(GraphQLView, self).dispatch(request, *args, **kwargs)
+
+    async def handle(self, request):
+        try:
+            data = self.parse_body(request)
+            if self.batch:
+                responses = [await self.aget_response(request, entry) for entry in data]
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = (
+                    responses
+                    and max(responses, key=lambda response: response[1])[1]
+                    or 200
+                )
+            else:
+                result, status_code = await self.aget_response(request, data)
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request) or []
+        if isinstance(middleware, MiddlewareManager):
+            middleware = list(middleware.middlewares)
+        return [*middleware, SyncRootFieldMiddleware()]
+
+    async def aget_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.aexecute_graphql_request(
+            request, data, query, variables, operation_name
+        )
+        return self.format_response(request, execution_result, id)
+
+    async def aexecute_graphql_request(self, request, data, query, variables, operation_name):
+        document, operation_ast, result = self.prepare_document(request, data, query, operation_name)
+        if document is None:
+            return result
+
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        execution_context_class = self.get_execution_context_class()
+        if execution_context_class:
+            execute_options["execution_context_class"] = execution_context_class
+        try:
+            result = execute(self.schema.graphql_schema, document, **execute_options)
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+@staff_member_required
+def document_cache_stats(request):
+    """
+    Hit/miss counters of the GraphQL document and persisted query caches.
+    Staff only: they reveal traffic patterns.
+    """
+    return JsonResponse(document_cache.stats())
+
+
+@staff_member_required
+def export(request, name, fmt):
+    """
+    Stream customers or orders as CSV or NDJSON. Takes the same filters as
+    ``allCustomers``/``allOrders`` as query parameters, e.g.
+    ``/export/orders.csv?order_date__gte=2025-01-01&product_ids_any=1,2``.
+    Staff only: exports are unbounded and include contact details.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'error': f"Unknown format '{fmt}'."}, status=400)
+    try:
+        queryset = exports.filtered_queryset(name, request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = StreamingHttpResponse(exports.stream_rows(name, queryset, fmt), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
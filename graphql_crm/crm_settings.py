@@ -0,0 +1,81 @@
+"""
+CRM app settings, shared by graphql_crm/settings.py and crm/settings.py.
+"""
+
+# Connection totalCount
+CRM_COUNT_CACHE_TTL = 30  # seconds a filtered count is reused
+CRM_COUNT_CAP = 10000  # exact counts stop scanning here
+
+# Parsed/validated document cache and Automatic Persisted Queries
+CRM_DOCUMENT_CACHE_SIZE = 256
+CRM_PERSISTED_QUERY_TTL = 60 * 60 * 24  # 1 day
+
+# Opt-in cache of read query responses, invalidated when Customer, Product
+# or Order rows change. None disables it.
+CRM_RESPONSE_CACHE_TTL = None
+
+# Query cost limits, checked before execution
+CRM_QUERY_MAX_COST = 5000
+CRM_QUERY_MAX_DEPTH = 12
+CRM_QUERY_LIST_SIZE = 10  # assumed length of plain list fields
+
+# Rows per existence check and bulk insert in bulk imports
+CRM_BULK_CHUNK_SIZE = 1000
+
+# Times order creation is retried after a deadlock or lock timeout
+CRM_STOCK_RESERVE_RETRIES = 3
+
+# Orders younger than this (seconds) wait for the next sales rollup run
+CRM_ROLLUP_LAG = 300
+
+# Search index backend: 'sqlite_fts', 'trigram' (PostgreSQL) or 'like'.
+# None picks the best one the database supports.
+CRM_SEARCH_BACKEND = None
+
+# Country code given to phone numbers entered without a leading +
+CRM_DEFAULT_PHONE_COUNTRY_CODE = '1'
+
+# Changes younger than this (seconds) are held back from the change feed
+# until their transactions have committed. Set it above the longest write
+# transaction: a change committed later than this after it was saved can
+# land behind a client's cursor and be missed
+CRM_CHANGE_FEED_LAG = 5
+
+# Rows fetched per round trip by the streaming exports
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# How scheduled jobs run their GraphQL operations: 'local' executes the
+# schema in-process, 'remote' posts to CRM_GRAPHQL_URL over a pooled session
+# (the heartbeat always probes CRM_GRAPHQL_URL, to check the web tier)
+CRM_JOB_MODE = 'local'
+CRM_GRAPHQL_URL = 'http://localhost:8000/graphql'
+CRM_JOB_HTTP_TIMEOUT = 10
+
+# Order reminders: pending orders of the last CRM_REMINDER_WINDOW_DAYS,
+# read CRM_REMINDER_CHUNK_SIZE at a time; orders younger than
+# CRM_REMINDER_LAG seconds wait for the next run
+CRM_REMINDER_WINDOW_DAYS = 7
+CRM_REMINDER_CHUNK_SIZE = 1000
+CRM_REMINDER_LAG = 60
+
+# Orders (by id) per shard of the weekly CRM report
+CRM_REPORT_SHARD_SIZE = 50000
+
+# Task locks and memoized idempotent mutation results live in this cache
+# alias, which must be shared by every web and worker process (Redis,
+# Memcached, or a DatabaseCache to keep them in the database). Locks expire
+# after CRM_TASK_LOCK_TTL seconds, results after CRM_IDEMPOTENCY_TTL
+CRM_LOCK_CACHE = 'default'
+CRM_TASK_LOCK_TTL = 3600
+CRM_IDEMPOTENCY_TTL = 86400
+
+# JSON-lines job logs (<dir>/<job>.jsonl): records are appended in batches
+# of CRM_JOB_LOG_BUFFER_SIZE, at most CRM_JOB_LOG_FLUSH_INTERVAL seconds
+# after they were logged, and at exit; files are rotated by size or age and
+# kept gzipped
+CRM_JOB_LOG_DIR = '/tmp/crm_job_logs'
+CRM_JOB_LOG_MAX_BYTES = 10 * 1024 * 1024
+CRM_JOB_LOG_ROTATE_SECONDS = 86400
+CRM_JOB_LOG_BACKUPS = 7
+CRM_JOB_LOG_BUFFER_SIZE = 100
+CRM_JOB_LOG_FLUSH_INTERVAL = 5
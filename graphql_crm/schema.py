@@ -1,5 +1,5 @@
 import graphene
-from crm.schema import Query as CRMQuery, Mutation as CRMMutation
+from crm.schema import Query as CRMQuery, Mutation as CRMMutation, CRMSchema
 
 class Query(CRMQuery, graphene.ObjectType):
     pass
@@ -7,4 +7,4 @@ class Query(CRMQuery, graphene.ObjectType):
 class Mutation(CRMMutation, graphene.ObjectType):
     pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = CRMSchema(query=Query, mutation=Mutation)
\ No newline at end of file
@@ -15,10 +15,11 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, document_cache_stats, export
 from .schema import schema
 
 urlpatterns = [
@@ -26,5 +27,14 @@ urlpatterns = [
 ]
 
 urlpatterns += [
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql", csrf_exempt(CRMGraphQLView.as_view(
+        graphiql=True,
+        schema=schema,
+        response_cache_ttl=getattr(settings, 'CRM_RESPONSE_CACHE_TTL', None),
+    ))),
+    # Served without holding a thread per request when run under ASGI
+    path("graphql/async", csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema))),
+    path("graphql/cache-stats", document_cache_stats),
+    # Streaming CSV/NDJSON exports, e.g. export/orders.csv
+    path("export/<str:name>.<str:fmt>", export),
 ]